@@ -1,5 +1,4 @@
-import requests
-from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+from __future__ import annotations
 from urllib.parse import (
     urljoin,
     urlparse,
@@ -8,33 +7,63 @@ from urllib.parse import (
     urlunparse,
 )
 from collections import OrderedDict, deque
-import waybackpy
 from datetime import datetime, timedelta, timezone
 import time
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import concurrent.futures
 import threading
+import queue
+import importlib
+import importlib.util
 import warnings
 import random
+import functools
+import math
 import os
 import logging
+import logging.handlers
+import atexit
 import sys
 import json
+import sqlite3
+import hashlib
+import tempfile
+import shutil
+import re
+import codecs
+from html.parser import HTMLParser
+import zlib
+import xml.etree.ElementTree as ET
 from pathlib import Path
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from selenium_stealth import stealth
-try:
-    from IPython.display import clear_output
-except ImportError:
-    def clear_output(wait=False):
-        pass  # No-op when not in Jupyter
-warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+from typing import NamedTuple
+class LazyModule:
+    # Stands in for a heavy dependency and imports it on first attribute access,
+    # so starting the CLI or GUI only pays for the libraries a run actually uses.
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module = None
+    def __getattr__(self, attribute: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+asyncio = LazyModule("asyncio")
+email_utils = LazyModule("email.utils")
+requests = LazyModule("requests")
+bs4 = LazyModule("bs4")
+waybackpy = LazyModule("waybackpy")
+urllib3_retry = LazyModule("urllib3.util.retry")
+webdriver = LazyModule("selenium.webdriver")
+selenium_by = LazyModule("selenium.webdriver.common.by")
+selenium_exceptions = LazyModule("selenium.common.exceptions")
+selenium_stealth = LazyModule("selenium_stealth")
+webdriver_manager_chrome = LazyModule("webdriver_manager.chrome")
+# The 'async' crawl engine needs httpx
+httpx = LazyModule("httpx") if importlib.util.find_spec("httpx") is not None else None
+def clear_output(wait=False):
+    # No-op outside Jupyter, where IPython is already loaded.
+    if "IPython" not in sys.modules:
+        return
+    from IPython.display import clear_output as ipython_clear_output
+    ipython_clear_output(wait=wait)
 SETTINGS_FILE = "settings.txt"
 def load_settings():
     try:
@@ -51,8 +80,12 @@ SETTINGS = {
     "archiving_cooldown": 90,          # Days between archiving the same URL
     "debug_mode": False,
     "default_archiving_action": "N",   # 'n' normal, 'a' archive all, 's' skip all
-    "max_archiver_workers": 1,         # 0 = unlimited
-    "max_crawler_workers": 10,         # 0 = Unlimited
+    "max_archiver_workers": 1,         # 0 = automatic: min(32, CPU cores + 4), Python's thread pool default
+    "max_crawler_workers": 10,         # 0 = automatic: min(32, CPU cores + 4), Python's thread pool default
+    # Random delay per browser-rendered page. With page_wait_strategy 'fixed' each worker sleeps
+    # it after loading the page; otherwise the host is held back for delay / crawler workers after
+    # each render, which also holds back its pages read without the browser. Hosts that are never
+    # rendered are never delayed by it.
     "min_link_search_delay": 0.0,
     "max_link_search_delay": 5.0,
     "max_crawl_runtime": 0,            # Maximum total crawling time in Seconds (0 = Unlimited)
@@ -63,19 +96,90 @@ SETTINGS = {
     "urls_per_minute_limit": 15,       # Wayback rate limit
     "restrict_sideways_crawling": False, # True to restrict crawling to sub-paths of the initial URL
     "restrict_backwards_crawling": True, # True to restrict crawling from going 'up' the path structure
+    "driver_pool_size": 0,             # Max warm WebDrivers kept alive (0 = match max_crawler_workers)
+    "driver_max_pages": 50,            # Pages a WebDriver renders before it is recycled
+    "link_extraction_mode": "script",  # 'script' = one JavaScript call per page, 'elements' = per-anchor lookups
+    # 'anchor_stable', 'dom_ready', 'network_idle', 'selector' or 'fixed'. Pages load with the 'eager'
+    # strategy, so 'dom_ready' can read links before scripts have added them.
+    "page_wait_strategy": "anchor_stable",
+    "page_wait_selector": "",          # CSS selector awaited by the 'selector' strategy
+    "page_wait_timeout": 10,           # Maximum seconds to wait for a rendered page to become ready
+    "page_wait_idle_ms": 500,          # Quiet period for the 'network_idle' and 'anchor_stable' strategies
+    "host_max_in_flight": 0,           # Max concurrent crawl tasks per host (0 = Unlimited)
+    "host_requests_per_minute": 0,     # Sustained crawl requests per minute per host (0 = Unlimited)
+    "host_burst": 5,                   # Requests a host may receive back-to-back before its rate limit applies
+    "cdx_prefetch": True,              # Fetch recent Wayback captures for each website (host) in bulk before archiving
+    "cdx_prefetch_max_pages": 100,     # Max CDX result pages fetched per host (a capped host falls back to per-URL lookups)
+    "archive_cache_file": "archive_cache.sqlite3", # Archive status kept between runs ("" = disabled)
+    "archive_cache_refresh": False,    # Ignore cached archive status and ask the Wayback Machine again
+    "archive_burst": 1,                # Save requests that may be sent back-to-back within urls_per_minute_limit
+    "archive_engine": "waybackpy",     # 'waybackpy' = blocking saves, 'spn2' = submit Save Page Now jobs and poll their status
+    "spn2_access_key": "",             # archive.org S3 access key used by the 'spn2' engine
+    "spn2_secret_key": "",             # archive.org S3 secret key used by the 'spn2' engine
+    "spn2_max_active_jobs": 5,         # Capture jobs allowed to be pending at once (0 = Unlimited)
+    "spn2_poll_interval": 5,           # Seconds between capture status polls
+    "checkpoint_file": "crawl_state.json", # Where crawl progress is saved for --resume ("" = disabled)
+    "checkpoint_interval": 60,         # Seconds between checkpoints
+    "crawl_storage": "memory",         # 'memory' or 'disk' (SQLite frontier, archive queue and visited index)
+    "crawl_storage_dir": "crawl_storage", # Folder for 'disk' crawl storage files
+    "crawl_storage_hot_window": 1000,  # Queued URLs kept in memory per host (and for the archive queue) in 'disk' mode
+    "visited_index": "exact",          # 'exact' or 'bloom' (Bloom filter of URL hashes with an on-disk exact tier)
+    "visited_filter_error_rate": 0.001, # Target false-positive rate of the 'bloom' visited index
+    "visited_filter_confirm": True,    # Confirm 'bloom' hits against the on-disk tier (exact dedup, slower)
+    "sitemap_seeding": True,           # Seed the crawl with URLs from robots.txt sitemaps and /sitemap.xml
+    "sitemap_max_files": 50,           # Max sitemap files (including sitemap indexes) read per site
+    "sitemap_max_urls": 50000,         # Max page URLs taken from sitemaps per site (0 = Unlimited)
+    "page_cache_file": "page_cache.sqlite3", # ETag/Last-Modified and links of fetched pages for conditional re-crawls ("" = disabled)
+    "page_cache_max_age_days": 30,     # Days a page cache entry is kept without being seen again
+    "log_file": "",                    # Also write log lines to this file ("" = console only)
+    "log_file_max_bytes": 5000000,     # Size at which the log file is rotated
+    "log_file_backups": 3,             # Rotated log files kept
+    "html_parser": "fast",             # 'fast' (href-only tokenizer) or 'beautifulsoup' for the requests fast path
+    "browser_escalation": "auto",      # When a fetched page is also rendered: 'auto', 'fallback_only' or 'always'
+    "escalation_learning_samples": 5,  # Renders per host before 'auto' decides whether rendering that host helps
+    "crawl_engine": "threads",         # 'threads' or 'async' (fetch static pages with httpx >= 0.20 on one event loop)
+    "async_max_connections": 200,      # Pages the 'async' engine fetches at once
+    "async_host_connections": 8,       # Pages the 'async' engine fetches at once from one host
+    "challenge_backoff_seconds": 30,   # First backoff for a host after a CAPTCHA/challenge page (doubles per repeat)
+    "challenge_max_backoff_seconds": 600, # Longest backoff for a challenged host
+    "fetch_status_retries": 1,         # Extra tries for a page answering 403/429 before falling back to the browser
+    "fetch_host_retry_budget": 20,     # Most 403/429 retries spent on one host per run
+    "max_retry_after_seconds": 60,     # Longest Retry-After a worker waits out; longer ones skip the retry
+    "dead_url_cache_file": "",         # SQLite file remembering 404/410 URLs between runs ("" keeps them for this run only)
+    "dead_url_max_age_days": 7,        # Dead URLs older than this are checked again
+    "resource_blocking": "balanced",   # What rendered pages skip downloading: 'off', 'balanced' or 'strict'
+    "blocked_url_patterns": [],        # Extra URL patterns the browser never requests, e.g. "*.example-cdn.com/*"
+    "browser_binary_path": "",         # Chrome/Chromium executable ("" finds it automatically)
+    "chromedriver_path": "",           # ChromeDriver executable ("" finds it automatically)
+    "driver_paths_file": "driver_paths.json", # Remembers the browser and driver that worked, for the next run ("" disables)
+    "offline_mode": False,             # Never download a ChromeDriver; use only what is installed
 }
 load_settings()
 # Thread-local storage
 _thread_local = threading.local()
-# Lock to ensure only one CAPTCHA prompt is active at a time
-captcha_prompt_lock = threading.Lock()
-# Archive rate limiting
-archive_lock = threading.Lock()
-last_archive_time = 0.0
-rate_limit_active_until_time = 0.0
-MIN_ARCHIVE_DELAY_SECONDS = 60 / SETTINGS["urls_per_minute_limit"]
+# Wayback CDX API
+CDX_ENDPOINT = "https://web.archive.org/cdx/search/cdx"
+CDX_PAGE_SIZE = 10000
+# Save Page Now (SPN2) API
+SPN2_SAVE_ENDPOINT = "https://web.archive.org/save"
+SPN2_STATUS_ENDPOINT = "https://web.archive.org/save/status"
+SPN2_STATUS_BATCH_SIZE = 50
+# Save Page Now rate limiting
+SPN_COOLDOWN_SECONDS = 60
+SPN_RATE_LIMIT_MARKERS = (
+    "Save Page Now limits saving 15 URLs per minutes",
+    "Too Many Requests",
+    "status code 429",
+    "error:user-session-limit",
+    "error:too-many-requests",
+)
 class CaptchaDetectedError(Exception):
-    #Raised when a CAPTCHA is detected on a page.
+    #Raised when a CAPTCHA is detected on a page and the driver should be replaced.
+    def __init__(self, url: str, proxy: str = None) -> None:
+        super().__init__(url)
+        self.proxy = proxy
+class HostChallengedError(Exception):
+    #Raised when a page was challenged; the URL is crawled again once its host's backoff ends.
     pass
 class ConnectionRefusedForCrawlerError(Exception):
     #Raised when a connection is refused for a given URL branch.
@@ -132,6 +236,58 @@ STEALTH_RENDERERS = [
 ]
 '''
 =========================
+Browser Resource Blocking
+=========================
+'''
+# Only the DOM's links are needed, so rendered pages can skip most subresources.
+BLOCKED_RESOURCE_EXTENSIONS = {
+    "images": ("apng", "avif", "bmp", "gif", "ico", "jpeg", "jpg", "png", "svg", "webp"),
+    "media": ("aac", "flac", "m3u8", "m4a", "m4s", "mov", "mp3", "mp4", "mpd", "oga", "ogg", "opus", "ts", "wav", "webm"),
+    "fonts": ("eot", "otf", "ttf", "woff", "woff2"),
+    "stylesheets": ("css",),
+}
+BLOCKED_TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "hotjar.com",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "segment.io",
+    "mixpanel.com",
+    "newrelic.com",
+    "nr-data.net",
+    "clarity.ms",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+)
+RESOURCE_BLOCKING_PROFILES = {
+    "off": (),
+    "balanced": ("images", "media", "fonts", "trackers"),
+    "strict": ("images", "media", "fonts", "stylesheets", "trackers"),
+}
+def get_blocked_url_patterns() -> list:
+    # Patterns in the wildcard form Network.setBlockedURLs expects.
+    profile = SETTINGS.get("resource_blocking", "balanced")
+    if profile not in RESOURCE_BLOCKING_PROFILES:
+        log_message("WARNING", f"Unknown resource_blocking profile '{profile}'. Using 'balanced'.", debug_only=True)
+        profile = "balanced"
+    patterns = []
+    for category in RESOURCE_BLOCKING_PROFILES[profile]:
+        if category == "trackers":
+            for domain in BLOCKED_TRACKER_DOMAINS:
+                patterns += [f"*://{domain}/*", f"*.{domain}/*"]
+            continue
+        for extension in BLOCKED_RESOURCE_EXTENSIONS[category]:
+            patterns += [f"*.{extension}", f"*.{extension}?*"]
+    patterns.extend(SETTINGS.get("blocked_url_patterns") or [])
+    return patterns
+'''
+=========================
 Irrelevant Extensions / Paths
 =========================
 '''
@@ -178,11 +334,148 @@ IRRELEVANT_PATH_SEGMENTS = (
     "/css/",
     "/img/",
 )
-def log_message(level: str, message: str, debug_only: bool = False) -> None:
+IRRELEVANT_EXTENSION_SET = frozenset(IRRELEVANT_EXTENSIONS)
+IRRELEVANT_SEGMENT_PATTERN = re.compile("|".join(re.escape(segment) for segment in IRRELEVANT_PATH_SEGMENTS))
+# Navigation and footer links repeat on every page, so URL helpers are memoized.
+URL_CACHE_SIZE = 65536
+'''
+=========================
+Browser Link Extraction
+=========================
+'''
+LINK_EXTRACTION_SCRIPT = """
+const selectors = [
+    ["a[href]", "href"],
+    ["area[href]", "href"],
+    ["link[rel][href]", "href"],
+    ["[data-href]", "data-href"],
+    ["[data-url]", "data-url"],
+    ["[data-link]", "data-link"],
+];
+const linkRels = ["alternate", "canonical", "next", "prev", "previous", "first", "last", "index", "up"];
+const hrefs = new Set();
+for (const [selector, attribute] of selectors) {
+    for (const element of document.querySelectorAll(selector)) {
+        if (element.tagName === "LINK") {
+            const rels = (element.getAttribute("rel") || "").toLowerCase().split(/\\s+/);
+            if (!rels.some(rel => linkRels.includes(rel))) {
+                continue;
+            }
+        }
+        const value = element.getAttribute(attribute);
+        if (!value) {
+            continue;
+        }
+        try {
+            hrefs.add(new URL(value.trim(), document.baseURI).href);
+        } catch (e) {
+        }
+    }
+}
+return Array.from(hrefs);
+"""
+class LogWriter:
+    # Formats and writes log lines on a background thread, so a worker only pays
+    # for a queue put. Sinks get a list of (level, line) pairs per batch.
+    def __init__(self) -> None:
+        self._queue = queue.SimpleQueue()
+        self._sinks = [self._write_console, self._write_file]
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._file_handler = None
+        self._file_path = None
+        self._timestamp_second = None
+        self._timestamp = ""
+    def submit(self, level: str, message: str, args: tuple) -> None:
+        self._queue.put((time.time(), level, message, args))
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+    def flush(self, timeout: float = 5) -> None:
+        if self._thread is None:
+            return
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        flushed.wait(timeout)
+    def add_sink(self, sink) -> None:
+        self._sinks.append(sink)
+    def remove_sink(self, sink) -> None:
+        if sink in self._sinks:
+            self._sinks.remove(sink)
+    def _format(self, record) -> tuple:
+        created, level, message, args = record
+        second = int(created)
+        if second != self._timestamp_second:
+            self._timestamp_second = second
+            self._timestamp = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError):
+                message = " ".join([message] + [str(arg) for arg in args])
+        return level, f"[{self._timestamp}][{level.upper()}] {message}"
+    def _run(self) -> None:
+        while True:
+            records = [self._queue.get()]
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            entries = []
+            flushed_events = []
+            for record in records:
+                if isinstance(record, threading.Event):
+                    flushed_events.append(record)
+                else:
+                    entries.append(self._format(record))
+            if entries:
+                for sink in list(self._sinks):
+                    try:
+                        sink(entries)
+                    except Exception:
+                        pass
+            for flushed in flushed_events:
+                flushed.set()
+    def _write_console(self, entries: list) -> None:
+        sys.stdout.write("".join(line + "\n" for _, line in entries))
+        sys.stdout.flush()
+    def _write_file(self, entries: list) -> None:
+        path = SETTINGS.get("log_file")
+        if path != self._file_path:
+            if self._file_handler is not None:
+                self._file_handler.close()
+            self._file_handler = None
+            self._file_path = path
+            if path:
+                self._file_handler = logging.handlers.RotatingFileHandler(
+                    path,
+                    maxBytes=SETTINGS.get("log_file_max_bytes", 5000000),
+                    backupCount=SETTINGS.get("log_file_backups", 3),
+                    encoding="utf-8",
+                )
+        if self._file_handler is not None:
+            for _, line in entries:
+                self._file_handler.emit(logging.makeLogRecord({"msg": line}))
+log_writer = LogWriter()
+atexit.register(log_writer.flush)
+def log_message(level: str, message: str, *args, debug_only: bool = False) -> None:
+    # Extra args are %-formatted into message on the writer thread, so hot
+    # paths can pass them unformatted and skip the work when debug is off.
     if debug_only and not SETTINGS["debug_mode"]:
         return
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}][{level.upper()}] {message}")
+    log_writer.submit(level, message, args)
+def add_log_sink(sink) -> None:
+    log_writer.add_sink(sink)
+def remove_log_sink(sink) -> None:
+    log_writer.remove_sink(sink)
+def flush_logs() -> None:
+    log_writer.flush()
+def default_worker_count() -> int:
+    # Same default ThreadPoolExecutor uses for max_workers=None
+    return min(32, (os.cpu_count() or 1) + 4)
 def generate_random_user_agent() -> str:
     os_part = random.choice(OS_TYPES)
     browser_template = random.choice(BROWSER_TYPES)
@@ -196,6 +489,7 @@ def generate_random_user_agent() -> str:
         version = "100"
     browser = browser_template.format(version=version)
     return f"Mozilla/5.0 ({os_part}) {browser}"
+@functools.lru_cache(maxsize=URL_CACHE_SIZE)
 def normalize_url(url: str) -> str:
     parsed = urlparse(url)
     scheme = parsed.scheme.lower()
@@ -219,6 +513,7 @@ def normalize_url(url: str) -> str:
         query_params.pop(p, None)
     query = urlencode(sorted(query_params.items()), doseq=True)
     return urlunparse((scheme, netloc, path, parsed.params, query, fragment))
+@functools.lru_cache(maxsize=URL_CACHE_SIZE)
 def get_root_domain(netloc: str) -> str:
     netloc = netloc.lower()
     parts = netloc.split(".")
@@ -228,14 +523,64 @@ def get_root_domain(netloc: str) -> str:
         return ".".join(parts[-2:])
     return netloc
 def is_irrelevant_link(url: str) -> bool:
-    parsed_url = urlparse(url)
-    path = parsed_url.path.lower()
-    if path.endswith(IRRELEVANT_EXTENSIONS):
+    path = urlparse(url).path.lower()
+    last_segment = path[path.rfind("/") + 1:]
+    extension_start = last_segment.rfind(".")
+    if extension_start != -1 and last_segment[extension_start:] in IRRELEVANT_EXTENSION_SET:
         return True
-    for segment in IRRELEVANT_PATH_SEGMENTS:
-        if segment in path:
-            return True
-    return False
+    return IRRELEVANT_SEGMENT_PATTERN.search(path) is not None
+class CrawlScopeFilter:
+    # Domain, irrelevant-link, sideways and backwards rules for links found on
+    # one root domain, with the path checks precomputed from the initial path
+    # and the verdict memoized per normalized URL.
+    def __init__(self, base_root_domain: str, initial_url_path: str, allow_external_links: bool,
+                 restrict_sideways_crawling: bool, restrict_backwards_crawling: bool) -> None:
+        self.base_root_domain = base_root_domain
+        self.initial_url_path = initial_url_path
+        self.allow_external_links = allow_external_links
+        self.sideways_prefix = None
+        if restrict_sideways_crawling:
+            self.sideways_prefix = initial_url_path if initial_url_path.endswith('/') else initial_url_path + '/'
+        # Paths that move up from the initial path: '/' and every parent directory.
+        self.parent_paths = frozenset()
+        if restrict_backwards_crawling and initial_url_path != '/':
+            self.parent_paths = frozenset(
+                {'/'} | {initial_url_path[:index] for index, char in enumerate(initial_url_path) if char == '/'}
+            )
+        self.skip_reasons = functools.lru_cache(maxsize=URL_CACHE_SIZE)(self._skip_reasons)
+    def _skip_reasons(self, clean_url: str) -> tuple:
+        parsed_url = urlparse(clean_url)
+        link_root_domain = get_root_domain(parsed_url.netloc)
+        reasons = []
+        if link_root_domain != self.base_root_domain and not self.allow_external_links:
+            reasons.append(f"External Domain ({link_root_domain} != {self.base_root_domain})")
+        if self.sideways_prefix is not None and not parsed_url.path.startswith(self.sideways_prefix):
+            reasons.append(f"Sideways Restriction (not within {self.initial_url_path})")
+        if parsed_url.path in self.parent_paths:
+            reasons.append(f"Backwards Restriction (moves up from {self.initial_url_path})")
+        if is_irrelevant_link(clean_url):
+            reasons.append("Irrelevant Link")
+        return tuple(reasons)
+    def allows(self, clean_url: str) -> bool:
+        return not self.skip_reasons(clean_url)
+@functools.lru_cache(maxsize=256)
+def _build_crawl_scope_filter(*filter_args) -> CrawlScopeFilter:
+    return CrawlScopeFilter(*filter_args)
+def get_crawl_scope_filter(base_root_domain: str, initial_url_path: str) -> CrawlScopeFilter:
+    # One filter per root domain and seed path for the current settings.
+    return _build_crawl_scope_filter(
+        base_root_domain,
+        initial_url_path,
+        bool(SETTINGS["allow_external_links"]),
+        bool(SETTINGS["restrict_sideways_crawling"]),
+        bool(SETTINGS["restrict_backwards_crawling"]),
+    )
+def is_save_rate_limit_error(error: Exception) -> bool:
+    too_many_requests_error = getattr(waybackpy.exceptions, "TooManyRequestsError", None)
+    if too_many_requests_error is not None and isinstance(error, too_many_requests_error):
+        return True
+    error_message = str(error)
+    return any(marker in error_message for marker in SPN_RATE_LIMIT_MARKERS)
 def redact_proxy(proxy: str) -> str:
     parsed = urlparse(proxy)
     if parsed.username or parsed.password:
@@ -249,70 +594,315 @@ def redact_proxy(proxy: str) -> str:
 HTTP Session
 =========================
 '''
-retry_strategy = Retry(
-    total=5,
-    backoff_factor=1,
-    status_forcelist=[403, 404, 429, 500, 502, 503, 504],
-    allowed_methods=False,
-)
-adapter = HTTPAdapter(max_retries=retry_strategy)
+def build_retry_strategy():
+    return urllib3_retry.Retry(
+        total=3,
+        backoff_factor=1,
+        # 403, 404 and 429 are left to FetchPolicy, which knows when another try can help.
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=urllib3_retry.Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+HTTP_POOL_HOSTS = 20
+_http_adapter = None
+_http_adapter_pool_size = 0
+_http_adapter_lock = threading.Lock()
+def get_http_adapter() -> requests.adapters.HTTPAdapter:
+    # One adapter, and so one connection pool per host, shared by all sessions.
+    # Each pool holds a connection for every worker thread that may use it.
+    global _http_adapter, _http_adapter_pool_size
+    pool_size = sum(
+        worker_count if worker_count > 0 else default_worker_count()
+        for worker_count in (SETTINGS["max_crawler_workers"], SETTINGS["max_archiver_workers"])
+    ) + 2
+    with _http_adapter_lock:
+        if _http_adapter is None or _http_adapter_pool_size != pool_size:
+            _http_adapter = requests.adapters.HTTPAdapter(
+                pool_connections=HTTP_POOL_HOSTS,
+                pool_maxsize=pool_size,
+                max_retries=build_retry_strategy(),
+            )
+            _http_adapter_pool_size = pool_size
+        return _http_adapter
 def get_requests_session() -> requests.Session:
-    session = requests.Session()
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    if SETTINGS["proxies"]:
-        proxy = random.choice(SETTINGS["proxies"])
-        session.proxies = {"http": proxy, "https": proxy}
-        log_message("DEBUG", f"Using proxy for requests session: {redact_proxy(proxy)}", debug_only=True)
+    # Sessions are reused per thread, and each thread sticks to one proxy, so
+    # connections stay alive across pages instead of a new handshake per fetch.
+    proxies = SETTINGS["proxies"]
+    proxy = getattr(_thread_local, "proxy", None)
+    if not proxies:
+        proxy = None
+    elif proxy not in proxies:
+        proxy = random.choice(proxies)
+        _thread_local.proxy = proxy
+    if not hasattr(_thread_local, "sessions"):
+        _thread_local.sessions = {}
+    session = _thread_local.sessions.get(proxy)
+    adapter = get_http_adapter()
+    if session is None:
+        session = requests.Session()
+        if proxy:
+            session.proxies = {"http": proxy, "https": proxy}
+            log_message("DEBUG", f"Using proxy for requests session: {redact_proxy(proxy)}", debug_only=True)
+        _thread_local.sessions[proxy] = session
+    if session.get_adapter("https://") is not adapter:
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
     return session
 '''
 =========================
+Fetch Policy
+=========================
+'''
+def parse_retry_after(value):
+    # Retry-After is either delta-seconds or an HTTP date.
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_dt = email_utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_dt.tzinfo is None:
+        retry_dt = retry_dt.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_dt - datetime.now(timezone.utc)).total_seconds())
+class DeadUrlCache:
+    # URLs that answered 404/410, shared by the crawler and the archiver. With a
+    # path they are also kept on disk, so later runs skip them straight away.
+    def __init__(self, path: str = "") -> None:
+        self.path = path
+        self._dead_urls = set()
+        self._lock = threading.Lock()
+        self._connection = None
+        if not path:
+            return
+        try:
+            self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS dead_urls ("
+                "url TEXT PRIMARY KEY, "
+                "status INTEGER, "
+                "checked_time REAL)"
+            )
+            self.prune()
+            self._dead_urls.update(row[0] for row in self._connection.execute("SELECT url FROM dead_urls"))
+        except sqlite3.Error as e:
+            log_message("WARNING", f"Could not open dead URL cache {path}: {e}", debug_only=False)
+            self._connection = None
+    def is_dead(self, url: str) -> bool:
+        return normalize_url(url) in self._dead_urls
+    def add(self, url: str, status: int) -> None:
+        clean_url = normalize_url(url)
+        with self._lock:
+            self._dead_urls.add(clean_url)
+            if self._connection is not None:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO dead_urls (url, status, checked_time) VALUES (?, ?, ?)",
+                    (clean_url, status, time.time()),
+                )
+    def prune(self) -> None:
+        if self._connection is None:
+            return
+        cutoff = time.time() - SETTINGS.get("dead_url_max_age_days", 7) * 24 * 3600
+        with self._lock:
+            self._connection.execute("DELETE FROM dead_urls WHERE checked_time < ?", (cutoff,))
+    def close(self) -> None:
+        if self._connection is None:
+            return
+        with self._lock:
+            self._connection.close()
+            self._connection = None
+class FetchPolicy:
+    # What a fetched status means: 404/410 mark the URL dead, 403/429 get a few
+    # retries (waiting out Retry-After) from a per-host budget, and anything
+    # else is returned as is. 5xx retries are done by the adapter (build_retry_strategy).
+    DEAD_STATUSES = frozenset({404, 410})
+    RETRY_STATUSES = frozenset({403, 429})
+    def __init__(self, dead_urls: DeadUrlCache = None) -> None:
+        if dead_urls is None:
+            dead_urls = DeadUrlCache(SETTINGS.get("dead_url_cache_file", ""))
+        self.dead_urls = dead_urls
+        self.status_retries = max(0, SETTINGS.get("fetch_status_retries", 1))
+        self.host_retry_budget = max(0, SETTINGS.get("fetch_host_retry_budget", 20))
+        self.max_retry_after = float(SETTINGS.get("max_retry_after_seconds", 60))
+        self.backoff_callback = None
+        self._host_retries = {}
+        self._lock = threading.Lock()
+    def retry_delay(self, url: str, resp, attempt: int):
+        # Seconds to wait before fetching url again, or None to keep this response.
+        if resp.status_code not in self.RETRY_STATUSES or attempt >= self.status_retries:
+            return None
+        host = urlparse(url).netloc
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        if retry_after is not None and self.backoff_callback is not None:
+            # Every worker holds off the host, not only the one that was told to.
+            self.backoff_callback(host, retry_after)
+        if retry_after is not None and retry_after > self.max_retry_after:
+            log_message("DEBUG", "%s asks to retry after %.0fs. Not waiting.", url, retry_after, debug_only=True)
+            return None
+        with self._lock:
+            retries_used = self._host_retries.get(host, 0)
+            if retries_used >= self.host_retry_budget:
+                return None
+            self._host_retries[host] = retries_used + 1
+        delay = retry_after if retry_after is not None else random.uniform(1, 3)
+        log_message("DEBUG", "%s answered %s. Retrying in %.1fs.", url, resp.status_code, delay, debug_only=True)
+        return delay
+    def record(self, url: str, resp) -> None:
+        if resp.status_code in self.DEAD_STATUSES:
+            log_message("DEBUG", "%s answered %s. Marking it dead.", url, resp.status_code, debug_only=True)
+            self.dead_urls.add(url, resp.status_code)
+    def get(self, session: requests.Session, url: str, **kwargs):
+        attempt = 0
+        while True:
+            resp = session.get(url, **kwargs)
+            delay = self.retry_delay(url, resp, attempt)
+            if delay is None:
+                self.record(url, resp)
+                return resp
+            attempt += 1
+            time.sleep(delay)
+    async def get_async(self, client, url: str, **kwargs):
+        attempt = 0
+        while True:
+            resp = await client.get(url, **kwargs)
+            delay = self.retry_delay(url, resp, attempt)
+            if delay is None:
+                # Marking a URL dead writes to SQLite, which must not block the event loop.
+                await asyncio.get_running_loop().run_in_executor(None, self.record, url, resp)
+                return resp
+            attempt += 1
+            await asyncio.sleep(delay)
+'''
+=========================
 WebDriver Manager
 =========================
 '''
+BROWSER_BINARY_PATHS = (
+    "/usr/bin/chromium",
+    "/usr/bin/chromium-browser",
+    "/snap/bin/chromium",
+    "/usr/bin/google-chrome",
+    "/usr/bin/google-chrome-stable",
+    "/snap/bin/google-chrome",
+)
+BROWSER_BINARY_NAMES = ("chromium", "chromium-browser", "google-chrome", "google-chrome-stable", "chrome")
+class BrowserRegistry:
+    # Finds the browser and ChromeDriver once per process instead of once per
+    # driver, and remembers a working pair in driver_paths_file for later runs.
+    # Explicit path settings always win; offline_mode never downloads a driver.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._browser_path = None
+        self._driver_path = None
+        self._is_resolved = False
+        self._downloaded_driver_path = None
+        self._download_attempted = False
+        self._is_saved = False
+    def _load_saved_paths(self) -> dict:
+        path = SETTINGS.get("driver_paths_file")
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved_paths = json.load(f)
+        except (OSError, ValueError) as e:
+            log_message("DEBUG", f"Could not read {path}: {e}", debug_only=True)
+            return {}
+        # Paths from an older run only count while the files are still there.
+        return {key: value for key, value in saved_paths.items() if isinstance(value, str) and os.path.isfile(value)}
+    def _resolve(self) -> None:
+        with self._lock:
+            if self._is_resolved:
+                return
+            if SETTINGS.get("offline_mode", False):
+                # Selenium Manager would otherwise look for a driver online.
+                os.environ.setdefault("SE_OFFLINE", "true")
+            saved_paths = self._load_saved_paths()
+            self._browser_path = SETTINGS.get("browser_binary_path") or saved_paths.get("browser") or self._find_browser()
+            self._driver_path = (
+                SETTINGS.get("chromedriver_path") or saved_paths.get("driver") or shutil.which("chromedriver")
+            )
+            self._is_resolved = True
+            log_message(
+                "DEBUG",
+                f"Browser: {self._browser_path or 'default'}, ChromeDriver: {self._driver_path or 'default'}",
+                debug_only=True,
+            )
+    def _find_browser(self):
+        for path in BROWSER_BINARY_PATHS:
+            if os.path.exists(path):
+                return path
+        for name in BROWSER_BINARY_NAMES:
+            path = shutil.which(name)
+            if path:
+                return path
+        return None
+    def browser_path(self):
+        self._resolve()
+        return self._browser_path
+    def driver_path(self):
+        self._resolve()
+        return self._driver_path
+    def download_driver(self):
+        # ChromeDriverManager checks online for the matching version, so it runs
+        # at most once per process and never in offline mode.
+        if SETTINGS.get("offline_mode", False) or SETTINGS.get("chromedriver_path"):
+            return None
+        with self._lock:
+            if not self._download_attempted:
+                self._download_attempted = True
+                try:
+                    self._downloaded_driver_path = webdriver_manager_chrome.ChromeDriverManager().install()
+                except Exception as e:
+                    log_message("ERROR", f"Could not download ChromeDriver: {str(e)}", debug_only=False)
+            return self._downloaded_driver_path
+    def record_working(self, driver_path) -> None:
+        with self._lock:
+            if driver_path == self._driver_path and self._is_saved:
+                return
+            self._driver_path = driver_path
+            self._is_saved = True
+            path = SETTINGS.get("driver_paths_file")
+            if not path or not (driver_path or self._browser_path):
+                return
+            try:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump({"browser": self._browser_path, "driver": driver_path}, f, indent=2)
+            except OSError as e:
+                log_message("DEBUG", f"Could not write {path}: {e}", debug_only=True)
+browser_registry = BrowserRegistry()
 class WebDriverManager:
     def __init__(self) -> None:
-        pass
-    def create_driver(self) -> webdriver.Chrome:
-        options = Options()
+        pool_size_setting = SETTINGS.get("driver_pool_size", 0) or SETTINGS["max_crawler_workers"]
+        self.max_pool_size = pool_size_setting if pool_size_setting > 0 else None
+        self.max_pages_per_driver = SETTINGS.get("driver_max_pages", 50)
+        self._idle_drivers = deque()
+        self._driver_page_counts = {}
+        self._driver_proxies = {}
+        self._live_driver_count = 0
+        self._pool_condition = threading.Condition()
+        self._is_closed = False
+    def create_driver(self, exclude_proxy: str = None) -> webdriver.Chrome:
+        options = webdriver.ChromeOptions()
         options.add_argument("--headless=new")
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
         options.add_argument("--disable-gpu")
-        browser_paths = [
-            '/usr/bin/chromium',
-            '/usr/bin/chromium-browser',
-            '/snap/bin/chromium',
-            '/usr/bin/google-chrome',
-            '/usr/bin/google-chrome-stable',
-            '/snap/bin/google-chrome'
-        ]
-        for path in browser_paths:
-            if os.path.exists(path):
-                options.binary_location = path
-                break
-        else:
-            try:
-                import subprocess
-                result = subprocess.run(['which', 'chromium-browser'],
-                                        stdout=subprocess.PIPE,
-                                        stderr=subprocess.DEVNULL,
-                                        text=True)
-                if result.returncode == 0 and result.stdout.strip():
-                    options.binary_location = result.stdout.strip()
-                    log_message("DEBUG", f"Found chromium-browser at: {result.stdout.strip()}", debug_only=True)
-                else:
-                    result = subprocess.run(['which', 'google-chrome'],
-                                            stdout=subprocess.PIPE,
-                                            stderr=subprocess.DEVNULL,
-                                            text=True)
-                    if result.returncode == 0 and result.stdout.strip():
-                        options.binary_location = result.stdout.strip()
-                        log_message("DEBUG", f"Found google-chrome at: {result.stdout.strip()}", debug_only=True)
-            except Exception as e:
-                log_message("DEBUG", f"Could not determine browser path automatically: {e}", debug_only=True)
+        page_wait_strategy = SETTINGS.get("page_wait_strategy", "anchor_stable")
+        if page_wait_strategy != "fixed":
+            options.page_load_strategy = "eager"
+        if page_wait_strategy == "network_idle":
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        browser_path = browser_registry.browser_path()
+        if browser_path:
+            options.binary_location = browser_path
+        proxy = None
         if SETTINGS["proxies"]:
-            proxy = random.choice(SETTINGS["proxies"])
+            proxy = random.choice([p for p in SETTINGS["proxies"] if p != exclude_proxy] or SETTINGS["proxies"])
             options.add_argument(f"--proxy-server={proxy}")
             log_message("DEBUG", f"Using proxy for Selenium: {redact_proxy(proxy)}", debug_only=True)
         prefs = {
@@ -321,22 +911,27 @@ class WebDriverManager:
             "safebrowsing.enabled": True,
             "download.default_directory": "/dev/null",
         }
+        if "images" in RESOURCE_BLOCKING_PROFILES.get(SETTINGS.get("resource_blocking", "balanced"), ()):
+            # Also covers images served without a file extension.
+            prefs["profile.managed_default_content_settings.images"] = 2
         options.add_experimental_option("prefs", prefs)
+        driver_path = browser_registry.driver_path()
         try:
-            driver = webdriver.Chrome(options=options)
+            driver = webdriver.Chrome(service=webdriver.ChromeService(executable_path=driver_path), options=options)
         except Exception as e:
-            log_message("DEBUG", f"System ChromeDriver failed, trying ChromeDriverManager: {str(e)}", debug_only=True)
+            fallback_driver_path = browser_registry.download_driver()
+            if fallback_driver_path is None or fallback_driver_path == driver_path:
+                log_message("CRITICAL", f"All WebDriver creation attempts failed: {str(e)}", debug_only=False)
+                raise
+            log_message("DEBUG", f"ChromeDriver {driver_path or 'on PATH'} failed, using downloaded one: {str(e)}", debug_only=True)
             try:
-                service = ChromeService(ChromeDriverManager().install())
-                driver = webdriver.Chrome(service=service, options=options)
+                driver = webdriver.Chrome(service=webdriver.ChromeService(executable_path=fallback_driver_path), options=options)
             except Exception as e2:
-                log_message("ERROR", f"Failed to create WebDriver: {str(e2)}", debug_only=False)
-                try:
-                    driver = webdriver.Chrome(service=None, options=options)
-                except Exception as e3:
-                    log_message("CRITICAL", f"All WebDriver creation attempts failed: {str(e3)}", debug_only=False)
-                    raise
-        stealth(
+                log_message("CRITICAL", f"All WebDriver creation attempts failed: {str(e2)}", debug_only=False)
+                raise
+            driver_path = fallback_driver_path
+        browser_registry.record_working(driver_path)
+        selenium_stealth.stealth(
             driver,
             languages=["en-US", "en"],
             vendor="Google Inc.",
@@ -346,27 +941,476 @@ class WebDriverManager:
             fix_hairline=True,
         )
         driver.set_page_load_timeout(240)
-        driver.implicitly_wait(10)
+        # Readiness is awaited explicitly, so element lookups must not block on misses.
+        driver.implicitly_wait(0)
+        self._apply_resource_blocking(driver)
+        with self._pool_condition:
+            self._driver_proxies[id(driver)] = proxy
         return driver
+    def driver_proxy(self, driver: webdriver.Chrome):
+        with self._pool_condition:
+            return self._driver_proxies.get(id(driver))
+    def _apply_resource_blocking(self, driver: webdriver.Chrome) -> None:
+        blocked_url_patterns = get_blocked_url_patterns()
+        if not blocked_url_patterns:
+            return
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_url_patterns})
+            log_message("DEBUG", "Blocking %s URL patterns in new WebDriver.", len(blocked_url_patterns), debug_only=True)
+        except Exception as e:
+            log_message("DEBUG", f"Could not set blocked URLs: {e}", debug_only=True)
     def destroy_driver(self, driver: webdriver.Chrome) -> None:
         try:
             driver.quit()
         except Exception:
             pass
+    def acquire_driver(self, fresh: bool = False, exclude_proxy: str = None) -> webdriver.Chrome:
+        # fresh skips the warm pool, so the page gets a new browser (and proxy).
+        retired_driver = None
+        with self._pool_condition:
+            while True:
+                if self._idle_drivers and not fresh:
+                    driver = self._idle_drivers.popleft()
+                    log_message("DEBUG", "Leasing warm WebDriver from pool.", debug_only=True)
+                    return driver
+                if self.max_pool_size is None or self._live_driver_count < self.max_pool_size:
+                    self._live_driver_count += 1
+                    break
+                if self._idle_drivers:
+                    # The pool is full; an idle driver makes room for the fresh one.
+                    retired_driver = self._idle_drivers.popleft()
+                    self._driver_page_counts.pop(id(retired_driver), None)
+                    self._driver_proxies.pop(id(retired_driver), None)
+                    break
+                self._pool_condition.wait()
+        if retired_driver is not None:
+            self.destroy_driver(retired_driver)
+        try:
+            driver = self.create_driver(exclude_proxy)
+        except Exception:
+            with self._pool_condition:
+                self._live_driver_count -= 1
+                self._pool_condition.notify()
+            raise
+        with self._pool_condition:
+            self._driver_page_counts[id(driver)] = 0
+        log_message("DEBUG", "Started new WebDriver for pool.", debug_only=True)
+        return driver
+    def release_driver(self, driver: webdriver.Chrome, discard: bool = False) -> None:
+        with self._pool_condition:
+            pages_rendered = self._driver_page_counts.get(id(driver), 0) + 1
+            self._driver_page_counts[id(driver)] = pages_rendered
+        if not discard and self.max_pages_per_driver > 0 and pages_rendered >= self.max_pages_per_driver:
+            log_message("DEBUG", f"Recycling WebDriver after {pages_rendered} pages.", debug_only=True)
+            discard = True
+        if not discard and not self._reset_driver_state(driver):
+            log_message("DEBUG", "WebDriver failed to reset, recycling it.", debug_only=True)
+            discard = True
+        with self._pool_condition:
+            if not discard and not self._is_closed:
+                self._idle_drivers.append(driver)
+                self._pool_condition.notify()
+                return
+            self._driver_page_counts.pop(id(driver), None)
+            self._driver_proxies.pop(id(driver), None)
+            self._live_driver_count -= 1
+            self._pool_condition.notify()
+        self.destroy_driver(driver)
+    def _reset_driver_state(self, driver: webdriver.Chrome) -> bool:
+        try:
+            parsed_current_url = urlparse(driver.current_url)
+            if parsed_current_url.scheme in ("http", "https") and parsed_current_url.netloc:
+                driver.execute_cdp_cmd(
+                    "Storage.clearDataForOrigin",
+                    {
+                        "origin": f"{parsed_current_url.scheme}://{parsed_current_url.netloc}",
+                        "storageTypes": "all",
+                    },
+                )
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.get("about:blank")
+            driver.execute_cdp_cmd(
+                "Network.setUserAgentOverride", {"userAgent": generate_random_user_agent()}
+            )
+            return True
+        except Exception as e:
+            log_message("DEBUG", f"Could not reset WebDriver state: {e}", debug_only=True)
+            return False
+    def close_all(self) -> None:
+        with self._pool_condition:
+            self._is_closed = True
+            idle_drivers = list(self._idle_drivers)
+            self._idle_drivers.clear()
+            for driver in idle_drivers:
+                self._driver_page_counts.pop(id(driver), None)
+                self._driver_proxies.pop(id(driver), None)
+            self._live_driver_count -= len(idle_drivers)
+            self._pool_condition.notify_all()
+        for driver in idle_drivers:
+            self.destroy_driver(driver)
+'''
+=========================
+Browser Escalation
+=========================
+'''
+FRAMEWORK_MOUNT_IDS = ("root", "app", "__next", "__nuxt", "___gatsby", "svelte")
+FRAMEWORK_ATTRIBUTES = ("ng-app", "ng-version", "data-reactroot", "data-v-app")
+def collect_page_signals(soup: bs4.BeautifulSoup, html_bytes: int) -> dict:
+    mount_elements = [element for element in (soup.find(id=mount_id) for mount_id in FRAMEWORK_MOUNT_IDS) if element]
+    mount_elements += [soup.find(attrs={attribute: True}) for attribute in FRAMEWORK_ATTRIBUTES]
+    noscript_text = " ".join(noscript.get_text(" ", strip=True) for noscript in soup.find_all("noscript")).lower()
+    return {
+        "html_bytes": html_bytes,
+        "script_bytes": sum(len(script.string or "") for script in soup.find_all("script")),
+        "text_chars": len(soup.get_text(" ", strip=True)),
+        "anchor_count": len(soup.find_all("a", href=True)),
+        "noscript_hint": "javascript" in noscript_text,
+        # A framework mount point with almost no text is an unrendered app shell.
+        "framework_shell": any(element and len(element.get_text(strip=True)) < 50 for element in mount_elements),
+    }
+class EscalationPolicy:
+    # Renders a page only when its plain fetch failed ('fallback_only').
+    def needs_browser(self, url: str, links: set, page_signals) -> bool:
+        return False
+    def record_render(self, url: str, fetched_links: set, rendered_links: set) -> None:
+        pass
+class AlwaysRenderPolicy(EscalationPolicy):
+    def needs_browser(self, url: str, links: set, page_signals) -> bool:
+        return True
+class HeuristicEscalationPolicy(EscalationPolicy):
+    # Renders pages that look like they build their links with JavaScript and
+    # learns per host whether rendering ever found links the fetch missed.
+    def __init__(self) -> None:
+        self.learning_samples = max(1, SETTINGS.get("escalation_learning_samples", 5))
+        self._host_stats = {}
+        self._lock = threading.Lock()
+    def _host_verdict(self, host: str):
+        with self._lock:
+            renders, helpful_renders = self._host_stats.get(host, (0, 0))
+        if renders < self.learning_samples:
+            return None
+        if helpful_renders == 0:
+            return False
+        if helpful_renders * 2 >= renders:
+            return True
+        return None
+    def needs_browser(self, url: str, links: set, page_signals) -> bool:
+        host_verdict = self._host_verdict(urlparse(url).netloc)
+        if host_verdict is not None:
+            return host_verdict
+        if page_signals is None:
+            return False
+        if page_signals["framework_shell"] or page_signals["noscript_hint"] or page_signals["anchor_count"] == 0:
+            return True
+        script_ratio = page_signals["script_bytes"] / max(1, page_signals["html_bytes"])
+        if script_ratio > 0.5 and page_signals["text_chars"] < 1000:
+            return True
+        return page_signals["anchor_count"] < 5 and page_signals["html_bytes"] > 50000
+    def record_render(self, url: str, fetched_links: set, rendered_links: set) -> None:
+        host = urlparse(url).netloc
+        found_new_links = bool(set(rendered_links) - set(fetched_links))
+        with self._lock:
+            renders, helpful_renders = self._host_stats.get(host, (0, 0))
+            self._host_stats[host] = (renders + 1, helpful_renders + found_new_links)
+        if renders + 1 == self.learning_samples:
+            log_message(
+                "DEBUG",
+                f"Rendering {host} found new links on {helpful_renders + found_new_links}/{renders + 1} pages.",
+                debug_only=True,
+            )
+ESCALATION_POLICIES = {
+    "auto": HeuristicEscalationPolicy,
+    "fallback_only": EscalationPolicy,
+    "always": AlwaysRenderPolicy,
+}
+'''
+=========================
+HTML Link Extraction
+=========================
+'''
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_.:-]+)', re.IGNORECASE)
+def decode_html(content: bytes, content_type: str = "") -> str:
+    # Header charset, then <meta charset>, then UTF-8. Avoids the whole-body
+    # encoding detection requests runs for resp.text when the header has none.
+    candidates = []
+    if "charset=" in content_type.lower():
+        candidates.append(content_type.lower().split("charset=", 1)[1].split(";", 1)[0].strip(' "\''))
+    meta_match = META_CHARSET_PATTERN.search(content[:2048])
+    if meta_match:
+        candidates.append(meta_match.group(1).decode("ascii", "ignore"))
+    for charset in candidates:
+        try:
+            codecs.lookup(charset)
+        except LookupError:
+            continue
+        return content.decode(charset, errors="replace")
+    return content.decode("utf-8", errors="replace")
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+def is_html_content_type(content_type: str) -> bool:
+    # A response without a Content-Type is treated as HTML.
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return not media_type or media_type in HTML_CONTENT_TYPES
+class HrefExtractor(HTMLParser):
+    # Only looks at the start tags that carry links plus the little bookkeeping
+    # the escalation policy needs, instead of building a document tree.
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.base_href = None
+        self.hrefs = []
+        self.script_bytes = 0
+        self.text_chars = 0
+        self.noscript_hint = False
+        self.framework_shell = False
+        self._raw_text_tag = None
+        self._noscript_depth = 0
+        self._mount_tag = None
+        self._mount_depth = 0
+        self._mount_text_chars = 0
+    def handle_starttag(self, tag, attrs):
+        if tag == "a" or tag == "area":
+            for name, value in attrs:
+                if name == "href" and value:
+                    self.hrefs.append(value.strip())
+                    break
+        elif tag == "base":
+            for name, value in attrs:
+                if name == "href" and value and self.base_href is None:
+                    self.base_href = value.strip()
+        elif tag == "script" or tag == "style":
+            self._raw_text_tag = tag
+        elif tag == "noscript":
+            self._noscript_depth += 1
+        if self._mount_tag is None:
+            for name, value in attrs:
+                if (name == "id" and value in FRAMEWORK_MOUNT_IDS) or name in FRAMEWORK_ATTRIBUTES:
+                    self._mount_tag = tag
+                    self._mount_depth = 1
+                    self._mount_text_chars = 0
+                    break
+        elif tag == self._mount_tag:
+            self._mount_depth += 1
+    def handle_endtag(self, tag):
+        if tag == self._raw_text_tag:
+            self._raw_text_tag = None
+        elif tag == "noscript" and self._noscript_depth:
+            self._noscript_depth -= 1
+        if tag == self._mount_tag:
+            self._mount_depth -= 1
+            if self._mount_depth <= 0:
+                self._close_mount()
+    def handle_data(self, data):
+        if self._raw_text_tag == "script":
+            self.script_bytes += len(data)
+            return
+        if self._raw_text_tag == "style":
+            return
+        text_chars = len(data.strip())
+        self.text_chars += text_chars
+        if self._mount_tag is not None:
+            self._mount_text_chars += text_chars
+        if self._noscript_depth and "javascript" in data.lower():
+            self.noscript_hint = True
+    def _close_mount(self) -> None:
+        # A framework mount point with almost no text is an unrendered app shell.
+        if self._mount_text_chars < 50:
+            self.framework_shell = True
+        self._mount_tag = None
+    def close(self) -> None:
+        super().close()
+        if self._mount_tag is not None:
+            self._close_mount()
+    def page_signals(self, html_bytes: int) -> dict:
+        return {
+            "html_bytes": html_bytes,
+            "script_bytes": self.script_bytes,
+            "text_chars": self.text_chars,
+            "anchor_count": len(self.hrefs),
+            "noscript_hint": self.noscript_hint,
+            "framework_shell": self.framework_shell,
+        }
+def extract_links_fast(content: bytes, base_url: str, content_type: str = ""):
+    extractor = HrefExtractor()
+    extractor.feed(decode_html(content, content_type))
+    extractor.close()
+    document_base = urljoin(base_url, extractor.base_href) if extractor.base_href else base_url
+    return [urljoin(document_base, href) for href in extractor.hrefs], extractor.page_signals(len(content))
+@functools.lru_cache(maxsize=None)
+def get_beautifulsoup():
+    # bs4 is imported on first use. Sitemaps and feeds parsed as HTML would warn on every page.
+    warnings.filterwarnings("ignore", category=bs4.XMLParsedAsHTMLWarning)
+    return bs4.BeautifulSoup
+def extract_links_soup(content: bytes, base_url: str, content_type: str = ""):
+    soup = get_beautifulsoup()(decode_html(content, content_type), "html.parser")
+    base_tag = soup.find("base", href=True)
+    document_base = urljoin(base_url, base_tag["href"].strip()) if base_tag else base_url
+    hrefs = [urljoin(document_base, a.get("href").strip()) for a in soup.find_all(["a", "area"]) if a.get("href")]
+    return hrefs, collect_page_signals(soup, len(content))
+HTML_PARSERS = {
+    "fast": extract_links_fast,
+    "beautifulsoup": extract_links_soup,
+}
+'''
+=========================
+Challenge Detection
+=========================
+'''
+CHALLENGE_DETECTION_SCRIPT = """
+const checks = [
+    ["recaptcha", "#g-recaptcha, .g-recaptcha, iframe[src*='recaptcha']"],
+    ["hcaptcha", "[class*='h-captcha'], iframe[src*='hcaptcha']"],
+    ["cloudflare", "div[class*='cf-challenge'], #challenge-form, #challenge-running, iframe[src*='challenges.cloudflare.com']"],
+];
+for (const [kind, selector] of checks) {
+    const element = document.querySelector(selector);
+    if (element) {
+        return [kind, selector];
+    }
+}
+const title = document.title || "";
+if (title.includes("Attention Required") || title.startsWith("Just a moment")) {
+    return ["cloudflare", "title: " + title];
+}
+const bodyText = document.body ? (document.body.textContent || "").toLowerCase() : "";
+if (bodyText.includes("verify you are human")) {
+    return ["text", "verify you are human"];
+}
+return null;
+"""
+class ChallengeVerdict(NamedTuple):
+    kind: str           # 'none', 'recaptcha', 'hcaptcha', 'cloudflare' or 'text'
+    indicator: str = ""
+    @property
+    def detected(self) -> bool:
+        return self.kind != "none"
+def detect_challenge(driver: webdriver.Chrome) -> ChallengeVerdict:
+    # All indicators in one script call; element lookups would each sit out the implicit wait.
+    try:
+        result = driver.execute_script(CHALLENGE_DETECTION_SCRIPT)
+    except selenium_exceptions.WebDriverException as e:
+        log_message("DEBUG", "Challenge detection script failed: %s", e, debug_only=True)
+        return ChallengeVerdict("none")
+    if not result:
+        return ChallengeVerdict("none")
+    return ChallengeVerdict(str(result[0]), str(result[1]))
+class HostChallengeTracker:
+    # Consecutive challenge pages per host. Each one doubles the host's backoff,
+    # which backoff_callback (the politeness scheduler) applies to every worker.
+    def __init__(self) -> None:
+        self.base_backoff = float(SETTINGS.get("challenge_backoff_seconds", 30))
+        self.max_backoff = float(SETTINGS.get("challenge_max_backoff_seconds", 600))
+        self.backoff_callback = None
+        self._challenge_counts = {}
+        self._lock = threading.Lock()
+    def record_challenge(self, host: str, verdict: ChallengeVerdict) -> float:
+        with self._lock:
+            challenge_count = self._challenge_counts.get(host, 0) + 1
+            self._challenge_counts[host] = challenge_count
+        backoff = min(self.max_backoff, self.base_backoff * 2 ** (challenge_count - 1)) * random.uniform(0.8, 1.2)
+        log_message(
+            "WARNING",
+            "%s challenge detected on %s (%s, %s in a row). Backing off the host for %.0f seconds.",
+            verdict.kind, host, verdict.indicator, challenge_count, backoff,
+            debug_only=True,
+        )
+        if self.backoff_callback is not None:
+            self.backoff_callback(host, backoff)
+        return backoff
+    def record_clear(self, host: str) -> None:
+        if host in self._challenge_counts:
+            with self._lock:
+                self._challenge_counts.pop(host, None)
+    def challenge_count(self, host: str) -> int:
+        with self._lock:
+            return self._challenge_counts.get(host, 0)
 '''
 =========================
 Crawler
 =========================
 '''
+class PageValidatorCache:
+    # HTTP validators, body hash, extracted links and page signals per fetched URL,
+    # so the requests fast path can send conditional GETs and skip parsing unchanged
+    # pages while the escalation policy still sees what the page looked like.
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS page_cache ("
+            "url TEXT PRIMARY KEY, "
+            "etag TEXT, "
+            "last_modified TEXT, "
+            "content_hash TEXT, "
+            "hrefs TEXT, "
+            "page_signals TEXT, "
+            "checked_time REAL)"
+        )
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(page_cache)")}
+        if "page_signals" not in columns:
+            # Caches written before page signals were kept.
+            self._connection.execute("ALTER TABLE page_cache ADD COLUMN page_signals TEXT")
+        self.prune()
+    def get(self, url: str):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, last_modified, content_hash, hrefs, page_signals FROM page_cache WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "content_hash": row[2],
+            "hrefs": json.loads(row[3]),
+            "page_signals": json.loads(row[4]) if row[4] else None,
+        }
+    def store(self, url: str, etag, last_modified, content_hash: str, hrefs: list, page_signals) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO page_cache "
+                "(url, etag, last_modified, content_hash, hrefs, page_signals, checked_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, content_hash, json.dumps(hrefs),
+                 json.dumps(page_signals) if page_signals is not None else None, time.time()),
+            )
+    def touch(self, url: str) -> None:
+        with self._lock:
+            self._connection.execute("UPDATE page_cache SET checked_time = ? WHERE url = ?", (time.time(), url))
+    def prune(self) -> None:
+        cutoff = time.time() - SETTINGS.get("page_cache_max_age_days", 30) * 24 * 3600
+        with self._lock:
+            self._connection.execute("DELETE FROM page_cache WHERE checked_time < ?", (cutoff,))
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
 class Crawler:
-    def __init__(self, webdriver_manager: WebDriverManager) -> None:
+    def __init__(self, webdriver_manager: WebDriverManager, escalation_policy: EscalationPolicy = None,
+                 fetch_policy: FetchPolicy = None) -> None:
         self.webdriver_manager = webdriver_manager
-    def _get_links_from_page_content(self, base_url: str, driver: webdriver.Chrome, initial_url_path: str):
+        self.challenge_tracker = HostChallengeTracker()
+        self.render_callback = None
+        self.fetch_policy = fetch_policy if fetch_policy is not None else FetchPolicy()
+        if escalation_policy is None:
+            policy_class = ESCALATION_POLICIES.get(SETTINGS.get("browser_escalation", "auto"), HeuristicEscalationPolicy)
+            escalation_policy = policy_class()
+        self.escalation_policy = escalation_policy
+        self.page_cache = None
+        if SETTINGS.get("page_cache_file"):
+            try:
+                self.page_cache = PageValidatorCache(SETTINGS["page_cache_file"])
+            except sqlite3.Error as e:
+                log_message("WARNING", f"Could not open page cache {SETTINGS['page_cache_file']}: {e}", debug_only=False)
+    def _get_links_from_page_content(self, base_url: str, driver: webdriver.Chrome, initial_url_path: str,
+                                     rotate_proxy_on_challenge: bool = False):
         links = set()
         relationships_on_page = []
         parsed_base_url = urlparse(base_url)
         base_netloc = parsed_base_url.netloc
         base_root_domain = get_root_domain(base_netloc)
+        scope_filter = get_crawl_scope_filter(base_root_domain, initial_url_path)
         log_message(
             "DEBUG",
             f"Starting _get_links_from_page_content for base_url: {base_url} "
@@ -381,99 +1425,42 @@ class Crawler:
                 driver.execute_cdp_cmd(
                     "Network.setUserAgentOverride", {"userAgent": random_user_agent}
                 )
+                if SETTINGS.get("page_wait_strategy", "anchor_stable") == "network_idle":
+                    self._drain_performance_log(driver)
+                if self.render_callback is not None:
+                    self.render_callback(base_netloc)
                 driver.get(base_url)
-                time.sleep(
-                    random.uniform(
-                        SETTINGS["min_link_search_delay"],
-                        SETTINGS["max_link_search_delay"],
-                    )
-                )
-                captcha_indicators = [
-                    (By.ID, "g-recaptcha"),
-                    (By.CLASS_NAME, "g-recaptcha"),
-                    (By.XPATH, "//iframe[contains(@src, 'recaptcha')]"),
-                    (By.XPATH, "//*[contains(@class, 'h-captcha')]"),
-                    (By.XPATH, "//iframe[contains(@src, 'hcaptcha')]"),
-                    (By.XPATH, "//*[contains(text(), 'verify you are human')]"),
-                    (By.XPATH, "//div[contains(@class, 'cf-challenge')]"),
-                    (By.XPATH, "//title[contains(text(), 'Attention Required')]"),
-                ]
-                captcha_detected = False
-                for by_type, value in captcha_indicators:
-                    if driver.find_elements(by_type, value):
-                        captcha_detected = True
-                        break
-                if captcha_detected:
-                    with captcha_prompt_lock:
-                        log_message(
-                            "WARNING",
-                            f"CAPTCHA DETECTED for {base_url}. Waiting 5-10 seconds...",
-                            debug_only=True,
-                        )
-                        time.sleep(random.uniform(5, 10))
-                        log_message(
-                            "INFO",
-                            "Attempting to continue after automated wait...",
-                            debug_only=True,
-                        )
+                self._wait_for_page_ready(base_url, driver)
+                verdict = detect_challenge(driver)
+                if verdict.detected:
+                    # The tracker defers the host; nothing waits in this worker.
+                    self.challenge_tracker.record_challenge(base_netloc, verdict)
+                    if rotate_proxy_on_challenge:
+                        raise CaptchaDetectedError(base_url)
+                    raise HostChallengedError(base_url)
+                else:
+                    self.challenge_tracker.record_clear(base_netloc)
                 log_message(
                     "DEBUG",
                     f"Page loaded for {base_url}. Extracting links...",
                     debug_only=True,
                 )
                 found_any_href = False
-                anchor_elements = driver.find_elements(By.TAG_NAME, "a")
-                log_message("DEBUG", f"Found {len(anchor_elements)} <a> tags on {base_url}", debug_only=True)
-                for anchor_element in anchor_elements:
-                    href = anchor_element.get_attribute("href")
+                hrefs = self._extract_hrefs(base_url, driver)
+                for href in hrefs:
                     if not href:
-                        log_message("DEBUG", f"Skipping <a> tag with no href attribute on {base_url}.", debug_only=True)
+                        log_message("DEBUG", "Skipping <a> tag with no href attribute on %s.", base_url, debug_only=True)
                         continue
                     found_any_href = True
-                    log_message("DEBUG", f"Found raw href: {href} on {base_url}", debug_only=True)
+                    log_message("DEBUG", "Found raw href: %s on %s", href, base_url, debug_only=True)
                     full_url = urljoin(base_url, href)
-                    parsed_full_url = urlparse(full_url)
-                    link_netloc = parsed_full_url.netloc
-                    link_root_domain = get_root_domain(link_netloc)
                     clean_url = normalize_url(full_url)
-                    clean_url_path = urlparse(clean_url).path
-                    is_valid_domain = (link_root_domain == base_root_domain or SETTINGS["allow_external_links"])
-                    is_not_irrelevant_extension = not is_irrelevant_link(clean_url)
-                    passes_sideways_restriction = True
-                    if SETTINGS["restrict_sideways_crawling"]:
-                        effective_initial_path = initial_url_path if initial_url_path.endswith('/') else initial_url_path + '/'
-                        passes_sideways_restriction = clean_url_path.startswith(effective_initial_path)
-                    passes_backwards_restriction = True
-                    if SETTINGS["restrict_backwards_crawling"]:
-                        if initial_url_path != '/':
-                            if clean_url_path == '/' or initial_url_path.startswith(clean_url_path + '/'):
-                                if clean_url_path == '/' and initial_url_path != '/':
-                                    passes_backwards_restriction = False
-                                elif initial_url_path.startswith(clean_url_path + '/'):
-                                    passes_backwards_restriction = False
-                    if is_valid_domain and is_not_irrelevant_extension and passes_sideways_restriction and passes_backwards_restriction:
-                        log_message(
-                            "INFO",
-                            f"Discovered internal link: {clean_url} "
-                            f" (Root domain: {link_root_domain})",
-                            debug_only=True
-                        )
+                    skip_reasons = scope_filter.skip_reasons(clean_url)
+                    if not skip_reasons:
+                        log_message("INFO", "Discovered internal link: %s", clean_url, debug_only=True)
                         links.add(clean_url)
                     else:
-                        skip_reason = []
-                        if not is_valid_domain:
-                            skip_reason.append(f"External Domain ({link_root_domain} != {base_root_domain})")
-                        if not passes_sideways_restriction:
-                            skip_reason.append(f"Sideways Restriction (not within {initial_url_path})")
-                        if not passes_backwards_restriction:
-                            skip_reason.append(f"Backwards Restriction (moves up from {initial_url_path})")
-                        if not is_not_irrelevant_extension:
-                            skip_reason.append("Irrelevant Link")
-                        log_message(
-                            "DEBUG",
-                            f"Skipping link: {full_url} - Reason: {'; '.join(skip_reason)}",
-                            debug_only=True,
-                        )
+                        log_message("DEBUG", "Skipping link: %s - Reason: %s", full_url, "; ".join(skip_reasons), debug_only=True)
                 if not found_any_href:
                     log_message(
                         "DEBUG",
@@ -486,7 +1473,9 @@ class Crawler:
                     debug_only=False,
                 )
                 return links, relationships_on_page
-            except TimeoutException:
+            except (CaptchaDetectedError, HostChallengedError):
+                raise
+            except selenium_exceptions.TimeoutException:
                 log_message(
                     "WARNING",
                     f"Page load timed out for {base_url}. Retrying ({retries - attempt - 1} attempts left).",
@@ -494,7 +1483,7 @@ class Crawler:
                 )
                 attempt += 1
                 time.sleep(random.uniform(5, 15))
-            except WebDriverException as e:
+            except selenium_exceptions.WebDriverException as e:
                 error_message_lower = str(e).lower()
                 if (
                     "net::err_connection_refused" in error_message_lower
@@ -531,66 +1520,698 @@ class Crawler:
             f"Failed to retrieve {base_url} after {retries} attempts.",
             debug_only=True,
         )
-        return set(), []
+        return None
+    def _wait_for_page_ready(self, base_url: str, driver: webdriver.Chrome) -> None:
+        strategy = SETTINGS.get("page_wait_strategy", "anchor_stable")
+        if strategy == "fixed":
+            time.sleep(
+                random.uniform(
+                    float(SETTINGS["min_link_search_delay"]),
+                    float(SETTINGS["max_link_search_delay"]),
+                )
+            )
+            return
+        start_time = time.time()
+        deadline = start_time + float(SETTINGS.get("page_wait_timeout", 10))
+        idle_seconds = float(SETTINGS.get("page_wait_idle_ms", 500)) / 1000
+        try:
+            is_ready = self._poll_script(
+                driver,
+                "return document.readyState === 'interactive' || document.readyState === 'complete';",
+                deadline,
+            )
+            if is_ready and strategy == "network_idle":
+                is_ready = self._wait_for_network_idle(driver, deadline, idle_seconds)
+            elif is_ready and strategy == "anchor_stable":
+                is_ready = self._wait_for_anchor_stability(driver, deadline, idle_seconds)
+            elif is_ready and strategy == "selector" and SETTINGS.get("page_wait_selector"):
+                is_ready = self._poll_script(
+                    driver,
+                    "return document.querySelector(arguments[0]) !== null;",
+                    deadline,
+                    SETTINGS["page_wait_selector"],
+                )
+        except selenium_exceptions.WebDriverException as e:
+            log_message("DEBUG", f"Readiness check failed on {base_url}: {e}", debug_only=True)
+            return
+        log_message(
+            "DEBUG",
+            f"{base_url} {'ready' if is_ready else 'not ready'} after {time.time() - start_time:.2f}s ({strategy}).",
+            debug_only=True,
+        )
+    def _poll_script(self, driver: webdriver.Chrome, script: str, deadline: float, *args) -> bool:
+        while True:
+            if driver.execute_script(script, *args):
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+    def _drain_performance_log(self, driver: webdriver.Chrome) -> list:
+        try:
+            return driver.get_log("performance")
+        except selenium_exceptions.WebDriverException:
+            return []
+    def _wait_for_network_idle(self, driver: webdriver.Chrome, deadline: float, idle_seconds: float) -> bool:
+        in_flight_requests = set()
+        last_activity_time = time.time()
+        while time.time() < deadline:
+            for entry in self._drain_performance_log(driver):
+                try:
+                    event = json.loads(entry["message"])["message"]
+                except (KeyError, TypeError, ValueError):
+                    continue
+                method = event.get("method")
+                request_id = event.get("params", {}).get("requestId")
+                if method == "Network.requestWillBeSent":
+                    in_flight_requests.add(request_id)
+                    last_activity_time = time.time()
+                elif method in ("Network.loadingFinished", "Network.loadingFailed"):
+                    in_flight_requests.discard(request_id)
+                    last_activity_time = time.time()
+            # Allow a couple of long-lived connections (analytics beacons, long polling)
+            if len(in_flight_requests) <= 2 and time.time() - last_activity_time >= idle_seconds:
+                return True
+            time.sleep(0.1)
+        return False
+    def _wait_for_anchor_stability(self, driver: webdriver.Chrome, deadline: float, idle_seconds: float) -> bool:
+        last_anchor_count = -1
+        stable_since = time.time()
+        while time.time() < deadline:
+            anchor_count = driver.execute_script("return document.querySelectorAll('a[href]').length;")
+            now = time.time()
+            if anchor_count != last_anchor_count:
+                last_anchor_count = anchor_count
+                stable_since = now
+            elif now - stable_since >= idle_seconds:
+                return True
+            time.sleep(0.1)
+        return False
+    def _extract_hrefs(self, base_url: str, driver: webdriver.Chrome) -> list:
+        if SETTINGS.get("link_extraction_mode", "script") == "script":
+            try:
+                hrefs = driver.execute_script(LINK_EXTRACTION_SCRIPT) or []
+                log_message("DEBUG", "Extracted %s hrefs via script on %s", len(hrefs), base_url, debug_only=True)
+                return hrefs
+            except selenium_exceptions.WebDriverException as e:
+                log_message(
+                    "DEBUG",
+                    f"Script link extraction failed on {base_url}: {e}. Falling back to element lookups.",
+                    debug_only=True,
+                )
+        anchor_elements = driver.find_elements(selenium_by.By.TAG_NAME, "a")
+        log_message("DEBUG", "Found %s <a> tags on %s", len(anchor_elements), base_url, debug_only=True)
+        return [anchor_element.get_attribute("href") for anchor_element in anchor_elements]
+    def _conditional_request_headers(self, url: str):
+        headers = {"User-Agent": generate_random_user_agent()}
+        cached_page = self.page_cache.get(url) if self.page_cache is not None else None
+        if cached_page is not None:
+            if cached_page["etag"]:
+                headers["If-None-Match"] = cached_page["etag"]
+            if cached_page["last_modified"]:
+                headers["If-Modified-Since"] = cached_page["last_modified"]
+        return headers, cached_page
     def _try_requests_first(self, url, initial_url_path: str):
         try:
             session = get_requests_session()
-            headers = {"User-Agent": generate_random_user_agent()}
-            resp = session.get(url, headers=headers, timeout=15)
-            if resp.status_code >= 400:
+            headers, cached_page = self._conditional_request_headers(url)
+            resp = self.fetch_policy.get(session, url, headers=headers, timeout=15)
+            return self._links_from_response(url, resp, cached_page, initial_url_path)
+        except Exception:
+            return None
+    def _links_from_response(self, url: str, resp, cached_page, initial_url_path: str):
+        # Shared by the requests fast path and the async engine; resp can be a
+        # requests or an httpx response. Returns (links, relationships, page_signals);
+        # an unchanged page reuses the links and signals cached when it was last parsed.
+        page_signals = None
+        try:
+            if resp.status_code == 304 and cached_page is not None:
+                hrefs = cached_page["hrefs"]
+                page_signals = cached_page["page_signals"]
+                self.page_cache.touch(url)
+                log_message("DEBUG", "%s not modified, reusing %s cached links.", url, len(hrefs), debug_only=True)
+            elif resp.status_code >= 400 or resp.status_code == 304:
                 return None
-            soup = BeautifulSoup(resp.text, "html.parser")
-            anchors = soup.find_all("a")
-            links = set()
-            relationships = []
-            parsed_base = urlparse(url)
-            base_root = get_root_domain(parsed_base.netloc)
-            for a in anchors:
-                href = a.get("href")
-                if not href:
-                    continue
-                full = urljoin(url, href)
-                clean = normalize_url(full)
-                parsed = urlparse(clean)
-                root = get_root_domain(parsed.netloc)
-                clean_url_path = parsed.path
-                is_valid_domain = (root == base_root or SETTINGS["allow_external_links"])
-                is_not_irrelevant_extension = not is_irrelevant_link(clean)
-                passes_sideways_restriction = True
-                if SETTINGS["restrict_sideways_crawling"]:
-                    effective_initial_path = initial_url_path if initial_url_path.endswith('/') else initial_url_path + '/'
-                    passes_sideways_restriction = clean_url_path.startswith(effective_initial_path)
-                passes_backwards_restriction = True
-                if SETTINGS["restrict_backwards_crawling"]:
-                    if initial_url_path != '/':
-                        if clean_url_path == '/' or initial_url_path.startswith(clean_url_path + '/'):
-                            if clean_url_path == '/' and initial_url_path != '/':
-                                passes_backwards_restriction = False
-                            elif initial_url_path.startswith(clean_url_path + '/'):
-                                passes_backwards_restriction = False
-                if is_valid_domain and is_not_irrelevant_extension and passes_sideways_restriction and passes_backwards_restriction:
-                    links.add(clean)
-            return links, relationships
+            else:
+                content_hash = hashlib.blake2b(resp.content, digest_size=16).hexdigest()
+                if cached_page is not None and cached_page["content_hash"] == content_hash:
+                    hrefs = cached_page["hrefs"]
+                    page_signals = cached_page["page_signals"]
+                else:
+                    extract_links = HTML_PARSERS.get(SETTINGS.get("html_parser", "fast"), extract_links_fast)
+                    # Relative links resolve against the final URL after redirects.
+                    content_type = resp.headers.get("Content-Type", "")
+                    hrefs, page_signals = extract_links(resp.content, str(resp.url or url), content_type)
+                    page_signals["html"] = is_html_content_type(content_type)
+                if self.page_cache is not None:
+                    self.page_cache.store(
+                        url, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), content_hash, hrefs,
+                        page_signals,
+                    )
+            scope_filter = get_crawl_scope_filter(get_root_domain(urlparse(url).netloc), initial_url_path)
+            links = {clean for clean in map(normalize_url, hrefs) if scope_filter.allows(clean)}
+            return links, [], page_signals
         except Exception:
             return None
     def crawl_single_page(self, url_to_crawl: str, initial_url_path: str):
+        if self.fetch_policy.dead_urls.is_dead(url_to_crawl):
+            log_message("DEBUG", "Skipping dead URL %s", url_to_crawl, debug_only=True)
+            return set(), []
         fast_result = self._try_requests_first(url_to_crawl, initial_url_path)
-        if fast_result:
-            return fast_result
-        driver = self.webdriver_manager.create_driver()
+        if fast_result is None and self.fetch_policy.dead_urls.is_dead(url_to_crawl):
+            # A 404/410 will not look any different in the browser.
+            return set(), []
+        if not self.needs_browser(url_to_crawl, fast_result):
+            return fast_result[:2]
+        return self.crawl_with_browser(url_to_crawl, initial_url_path, fast_result)
+    def needs_browser(self, url: str, fast_result) -> bool:
+        # Pages the fetch could not read are rendered; documents that are not HTML never are.
+        if fast_result is None:
+            return True
+        links, _, page_signals = fast_result
+        if page_signals is not None and not page_signals.get("html", True):
+            return False
+        return self.escalation_policy.needs_browser(url, links, page_signals)
+    def crawl_with_browser(self, url_to_crawl: str, initial_url_path: str, fast_result=None):
+        try:
+            render_result = self._render_page(
+                url_to_crawl, initial_url_path, rotate_proxy_on_challenge=bool(SETTINGS["proxies"])
+            )
+        except CaptchaDetectedError as e:
+            # Retried once on a new browser behind a different proxy.
+            render_result = self._render_page(
+                url_to_crawl, initial_url_path, rotate_proxy_on_challenge=False, fresh_driver=True, exclude_proxy=e.proxy
+            )
+        if render_result is None:
+            # Retries were used up. A failed render says nothing about the host, so it is not recorded.
+            links, relationships = set(), []
+        else:
+            links, relationships = render_result
+            if fast_result is not None:
+                self.escalation_policy.record_render(url_to_crawl, fast_result[0], links)
+        if fast_result is not None:
+            # Links only the fetch saw (e.g. inside <noscript>) are kept too.
+            links = set(links) | set(fast_result[0])
+        return links, relationships
+    def _render_page(self, url_to_crawl: str, initial_url_path: str, rotate_proxy_on_challenge: bool,
+                     fresh_driver: bool = False, exclude_proxy: str = None):
+        driver = self.webdriver_manager.acquire_driver(fresh=fresh_driver, exclude_proxy=exclude_proxy)
+        discard_driver = False
         try:
-            return self._get_links_from_page_content(url_to_crawl, driver, initial_url_path)
-        except ConnectionRefusedForCrawlerError as e:
-            raise e
+            return self._get_links_from_page_content(url_to_crawl, driver, initial_url_path, rotate_proxy_on_challenge)
+        except (ConnectionRefusedForCrawlerError, HostChallengedError):
+            raise
+        except CaptchaDetectedError as e:
+            discard_driver = True
+            e.proxy = self.webdriver_manager.driver_proxy(driver)
+            raise
+        except Exception:
+            discard_driver = True
+            raise
         finally:
-            self.webdriver_manager.destroy_driver(driver)
+            self.webdriver_manager.release_driver(driver, discard=discard_driver)
+'''
+=========================
+Async Fetch Engine
+=========================
+'''
+class AsyncFetchEngine:
+    # Runs the requests fast path on an asyncio loop in one background thread,
+    # so hundreds of static pages can be in flight without a thread each. Pages
+    # the fast path cannot handle are passed on to the browser executor.
+    def __init__(self, crawler: Crawler) -> None:
+        self.crawler = crawler
+        self.max_connections = max(1, SETTINGS.get("async_max_connections", 200))
+        self.host_connections = max(1, SETTINGS.get("async_host_connections", 8))
+        self.http2_enabled = importlib.util.find_spec("h2") is not None
+        self._clients = {}
+        self._host_semaphores = {}
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._loop_thread.start()
+    def submit(self, url: str, initial_url_path: str, browser_executor) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(self._crawl(url, initial_url_path, browser_executor), self._loop)
+    def _get_client(self, host: str):
+        # One client per proxy, and each host always goes through the same proxy
+        # so its keep-alive connections are reused.
+        proxies = SETTINGS["proxies"]
+        proxy = proxies[url_hash64(host) % len(proxies)] if proxies else None
+        client = self._clients.get(proxy)
+        if client is None:
+            client_options = {
+                "http2": self.http2_enabled,
+                "follow_redirects": True,
+                "timeout": 15,
+                "limits": httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            }
+            try:
+                client = httpx.AsyncClient(proxy=proxy, **client_options)
+            except TypeError:
+                # httpx < 0.26 only accepts proxies=
+                client = httpx.AsyncClient(proxies=proxy, **client_options)
+            self._clients[proxy] = client
+        return client
+    async def _crawl(self, url: str, initial_url_path: str, browser_executor):
+        loop = asyncio.get_running_loop()
+        fetch_policy = self.crawler.fetch_policy
+        if fetch_policy.dead_urls.is_dead(url):
+            return set(), []
+        result = None
+        try:
+            host = urlparse(url).netloc
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = asyncio.Semaphore(self.host_connections)
+            async with self._host_semaphores[host]:
+                # The page cache lookup is a SQLite query, so it runs off the event loop too.
+                headers, cached_page = await loop.run_in_executor(None, self.crawler._conditional_request_headers, url)
+                resp = await fetch_policy.get_async(self._get_client(host), url, headers=headers)
+            # Parsing is CPU work, so it runs off the event loop.
+            result = await loop.run_in_executor(
+                None, self.crawler._links_from_response, url, resp, cached_page, initial_url_path
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_message("DEBUG", "Async fetch of %s failed: %s", url, e, debug_only=True)
+        if result is None and fetch_policy.dead_urls.is_dead(url):
+            return set(), []
+        if not self.crawler.needs_browser(url, result):
+            return result[:2]
+        return await loop.run_in_executor(
+            browser_executor, self.crawler.crawl_with_browser, url, initial_url_path, result
+        )
+    async def _shutdown(self) -> None:
+        # Fetches still in flight when the crawl ends are cancelled before their clients close.
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        clients = list(self._clients.values())
+        self._clients = {}
+        for client in clients:
+            await client.aclose()
+    def close(self) -> None:
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=10)
+        except Exception as e:
+            log_message("DEBUG", f"Could not close async HTTP clients: {e}", debug_only=True)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join(timeout=10)
+        if not self._loop_thread.is_alive():
+            self._loop.close()
+'''
+=========================
+Sitemap Seeding
+=========================
+'''
+class SitemapSeeder:
+    # Reads robots.txt and the sitemaps it lists (or /sitemap.xml) for a seed
+    # URL. Sitemaps are streamed through an incremental parser, so even large
+    # gzipped sitemap indexes never sit in memory as a whole.
+    def collect_links(self, seed_url: str, initial_url_path: str):
+        parsed_seed = urlparse(seed_url)
+        site_root = f"{parsed_seed.scheme}://{parsed_seed.netloc}"
+        base_root_domain = get_root_domain(parsed_seed.netloc)
+        scope_filter = get_crawl_scope_filter(base_root_domain, initial_url_path)
+        max_files = SETTINGS.get("sitemap_max_files", 50)
+        max_urls = SETTINGS.get("sitemap_max_urls", 50000)
+        session = get_requests_session()
+        sitemap_queue = deque(self._sitemaps_from_robots(session, site_root) or [f"{site_root}/sitemap.xml"])
+        seen_sitemaps = set(sitemap_queue)
+        links = set()
+        files_read = 0
+        while sitemap_queue and files_read < max_files:
+            sitemap_url = sitemap_queue.popleft()
+            files_read += 1
+            try:
+                for kind, loc in self._iter_sitemap(session, sitemap_url):
+                    full_url = urljoin(sitemap_url, loc)
+                    if kind == "sitemap":
+                        if full_url not in seen_sitemaps and get_root_domain(urlparse(full_url).netloc) == base_root_domain:
+                            seen_sitemaps.add(full_url)
+                            sitemap_queue.append(full_url)
+                        continue
+                    clean_url = normalize_url(full_url)
+                    if scope_filter.allows(clean_url):
+                        links.add(clean_url)
+                        if max_urls > 0 and len(links) >= max_urls:
+                            log_message("INFO", f"Sitemap URL limit of {max_urls} reached for {site_root}.", debug_only=True)
+                            return links, []
+            except Exception as e:
+                log_message("DEBUG", f"Could not read sitemap {sitemap_url}: {e}", debug_only=True)
+        log_message(
+            "INFO",
+            f"Found {len(links)} URLs in {files_read} sitemap file(s) for {site_root}.",
+            debug_only=False,
+        )
+        return links, []
+    def _sitemaps_from_robots(self, session: requests.Session, site_root: str) -> list:
+        try:
+            resp = session.get(f"{site_root}/robots.txt", headers={"User-Agent": generate_random_user_agent()}, timeout=15)
+            if resp.status_code >= 400:
+                return []
+        except Exception as e:
+            log_message("DEBUG", f"Could not read robots.txt for {site_root}: {e}", debug_only=True)
+            return []
+        sitemaps = []
+        for line in resp.text.splitlines():
+            field, _, value = line.partition(":")
+            if field.strip().lower() == "sitemap" and value.strip():
+                sitemap_url = urljoin(site_root + "/", value.strip())
+                if sitemap_url not in sitemaps:
+                    sitemaps.append(sitemap_url)
+        return sitemaps
+    def _iter_sitemap(self, session: requests.Session, sitemap_url: str):
+        # Yields ("sitemap", loc) for sitemap index entries and ("url", loc) for pages.
+        with session.get(
+            sitemap_url,
+            headers={"User-Agent": generate_random_user_agent()},
+            timeout=30,
+            stream=True,
+        ) as resp:
+            if resp.status_code >= 400:
+                return
+            parser = ET.XMLPullParser(events=("start", "end"))
+            root = None
+            for data in self._iter_body(resp):
+                if data is None:
+                    parser.close()
+                else:
+                    parser.feed(data)
+                for event, element in parser.read_events():
+                    tag = element.tag.rsplit("}", 1)[-1]
+                    if event == "start":
+                        if root is None:
+                            root = element
+                        continue
+                    if tag == "loc" and element.text and element.text.strip():
+                        yield ("sitemap" if root.tag.endswith("sitemapindex") else "url"), element.text.strip()
+                    elif tag in ("url", "sitemap"):
+                        # Finished entries are dropped so memory stays flat.
+                        root.clear()
+    def _iter_body(self, resp):
+        # Decoded body chunks, gunzipped when the file itself is gzipped
+        # (sitemap.xml.gz), then None once the body is done.
+        decompressor = None
+        for chunk_index, chunk in enumerate(resp.iter_content(chunk_size=65536)):
+            if chunk_index == 0 and chunk[:2] == b"\x1f\x8b":
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            yield decompressor.decompress(chunk) if decompressor is not None else chunk
+        yield None
 '''
 =========================
 Archiver
 =========================
 '''
-class Archiver:
+class SavePageNowRateLimiter:
+    # Token bucket shared by all archiver workers. Only the reservation is
+    # serialized; callers sleep and save without holding the lock.
+    def __init__(self, urls_per_minute: float, burst: int = 1) -> None:
+        self.refill_rate = max(urls_per_minute, 0.001) / 60
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last_refill_time = time.time()
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+    def reserve(self) -> float:
+        # Claims the next save slot and returns how long to wait before using it.
+        with self._lock:
+            now = time.time()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._last_refill_time) * self.refill_rate)
+            self._last_refill_time = now
+            self._tokens -= 1
+            token_wait = -self._tokens / self.refill_rate if self._tokens < 0 else 0.0
+            return max(token_wait, self._cooldown_until - now)
+    def cooldown_remaining(self) -> float:
+        with self._lock:
+            return max(0.0, self._cooldown_until - time.time())
+    def trigger_cooldown(self, seconds: float) -> None:
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.time() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+class SavePageNowJobPoller:
+    # Tracks submitted SPN2 capture jobs and resolves their futures from a
+    # single polling thread using batched status requests.
+    def __init__(self, auth_header: str) -> None:
+        self.auth_header = auth_header
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._poller_thread = None
+    def track(self, job_id: str, url: str) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        with self._condition:
+            self._jobs[job_id] = (future, url, time.time())
+            if self._poller_thread is None or not self._poller_thread.is_alive():
+                self._poller_thread = threading.Thread(target=self._poll_loop, daemon=True)
+                self._poller_thread.start()
+            self._condition.notify()
+        return future
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._jobs)
+    def _resolve(self, job_id: str, status: str) -> None:
+        with self._condition:
+            job = self._jobs.pop(job_id, None)
+        if job is None:
+            return
+        future, url, _ = job
+        try:
+            future.set_result((status, url))
+        except concurrent.futures.InvalidStateError:
+            pass
+    def _poll_loop(self) -> None:
+        while True:
+            with self._condition:
+                if not self._jobs:
+                    self._poller_thread = None
+                    return
+                self._condition.wait(timeout=float(SETTINGS.get("spn2_poll_interval", 5)))
+                now = time.time()
+                job_ids = []
+                for job_id, (future, url, submitted_time) in list(self._jobs.items()):
+                    if future.cancelled():
+                        del self._jobs[job_id]
+                    elif now - submitted_time > SETTINGS["archive_timeout_seconds"]:
+                        log_message(
+                            "INFO",
+                            f"Capture job for {url} did not finish within {SETTINGS['archive_timeout_seconds']} seconds.",
+                            debug_only=True,
+                        )
+                        job_ids.append((job_id, "FAILED"))
+                    else:
+                        job_ids.append((job_id, None))
+            for job_id, status in job_ids:
+                if status is not None:
+                    self._resolve(job_id, status)
+            pending_job_ids = [job_id for job_id, status in job_ids if status is None]
+            for batch_start in range(0, len(pending_job_ids), SPN2_STATUS_BATCH_SIZE):
+                self._poll_batch(pending_job_ids[batch_start:batch_start + SPN2_STATUS_BATCH_SIZE])
+    def _poll_batch(self, job_ids: list) -> None:
+        try:
+            session = get_requests_session()
+            resp = session.post(
+                SPN2_STATUS_ENDPOINT,
+                data={"job_ids": ",".join(job_ids)},
+                headers={"Accept": "application/json", "Authorization": self.auth_header},
+                timeout=60,
+            )
+            resp.raise_for_status()
+            statuses = resp.json()
+        except Exception as e:
+            log_message("WARNING", f"Could not poll {len(job_ids)} capture jobs: {e}", debug_only=True)
+            return
+        if isinstance(statuses, dict):
+            statuses = [statuses]
+        for job_status in statuses:
+            job_id = job_status.get("job_id")
+            state = job_status.get("status")
+            if state == "success":
+                self._resolve(job_id, "ARCHIVED")
+            elif state == "error":
+                log_message(
+                    "WARNING",
+                    f"Capture job {job_id} failed: {job_status.get('status_ext') or job_status.get('message')}",
+                    debug_only=True,
+                )
+                self._resolve(job_id, "FAILED")
+    def cancel_all(self) -> None:
+        with self._condition:
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+            self._condition.notify()
+        for future, _, _ in jobs:
+            future.cancel()
+class ArchiveStatusCache:
+    # Last known snapshot and save outcome per normalized URL, kept on disk so
+    # repeated runs skip URLs archived within the cooldown without asking CDX.
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS archive_status ("
+            "url TEXT PRIMARY KEY, "
+            "last_snapshot_time REAL, "
+            "last_attempt_time REAL, "
+            "last_outcome TEXT)"
+        )
+        self.prune()
+    def _cooldown_seconds(self) -> float:
+        return SETTINGS["archiving_cooldown"] * 24 * 3600
+    def get_recent_snapshot(self, url: str):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT last_snapshot_time FROM archive_status WHERE url = ?",
+                (normalize_url(url),),
+            ).fetchone()
+        if not row or row[0] is None or time.time() - row[0] >= self._cooldown_seconds():
+            return None
+        return datetime.fromtimestamp(row[0], timezone.utc)
+    def record_snapshot(self, url: str, snapshot_dt: datetime) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO archive_status (url, last_snapshot_time) VALUES (?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET last_snapshot_time = "
+                "MAX(COALESCE(last_snapshot_time, 0), excluded.last_snapshot_time)",
+                (normalize_url(url), snapshot_dt.timestamp()),
+            )
+    def record_attempt(self, url: str, outcome: str) -> None:
+        now = time.time()
+        snapshot_time = now if outcome == "ARCHIVED" else None
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO archive_status (url, last_snapshot_time, last_attempt_time, last_outcome) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET "
+                "last_snapshot_time = COALESCE(excluded.last_snapshot_time, last_snapshot_time), "
+                "last_attempt_time = excluded.last_attempt_time, "
+                "last_outcome = excluded.last_outcome",
+                (normalize_url(url), snapshot_time, now, outcome),
+            )
+    def prune(self) -> None:
+        # Entries older than the cooldown can no longer cause a skip.
+        cutoff = time.time() - self._cooldown_seconds()
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM archive_status WHERE COALESCE(last_snapshot_time, 0) < ? "
+                "AND COALESCE(last_attempt_time, 0) < ?",
+                (cutoff, cutoff),
+            )
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+class WaybackSnapshotIndex:
+    # Captures inside the archiving cooldown, fetched once per seed host with
+    # paged CDX domain queries so should_archive rarely needs its own lookup.
     def __init__(self) -> None:
+        self._latest_snapshots = {}
+        self._covered_domains = set()
+        self._attempted_domains = set()
+        self._domain_locks = {}
+        self._lock = threading.Lock()
+    @staticmethod
+    def snapshot_key(url: str) -> str:
+        parsed = urlparse(normalize_url(url))
+        host = parsed.netloc
+        if host.endswith(":80") or host.endswith(":443"):
+            host = host.rsplit(":", 1)[0]
+        if host.startswith("www."):
+            host = host[4:]
+        return host + parsed.path + (f"?{parsed.query}" if parsed.query else "")
+    @staticmethod
+    def prefetch_host(url: str) -> str:
+        # The URL's own host, not get_root_domain(): that keeps the last two labels,
+        # which would turn blog.example.co.uk into a scan of all of co.uk.
+        host = urlparse(normalize_url(url)).hostname or ""
+        return host[4:] if host.startswith("www.") else host
+    def _fetch_domain(self, host: str) -> bool:
+        cutoff_dt = datetime.now(timezone.utc) - timedelta(days=SETTINGS["archiving_cooldown"])
+        params = {
+            "url": host,
+            "matchType": "domain",
+            "collapse": "urlkey",
+            "fl": "original,timestamp",
+            "from": cutoff_dt.strftime("%Y%m%d%H%M%S"),
+            "limit": CDX_PAGE_SIZE,
+            "showResumeKey": "true",
+        }
+        session = get_requests_session()
+        headers = {"User-Agent": generate_random_user_agent()}
+        snapshots = {}
+        max_pages = SETTINGS.get("cdx_prefetch_max_pages", 100)
+        for page_number in range(1, max_pages + 1):
+            try:
+                resp = session.get(CDX_ENDPOINT, params=params, headers=headers, timeout=60)
+                resp.raise_for_status()
+            except Exception as e:
+                log_message("WARNING", f"CDX prefetch for {host} failed on page {page_number}: {e}", debug_only=True)
+                return False
+            lines = resp.text.splitlines()
+            resume_key = None
+            if "" in lines:
+                separator_index = lines.index("")
+                resume_key = next((line for line in lines[separator_index + 1:] if line), None)
+                lines = lines[:separator_index]
+            for line in lines:
+                try:
+                    original, timestamp = line.rsplit(" ", 1)
+                    snapshot_dt = datetime.strptime(timestamp, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+                except ValueError:
+                    continue
+                key = self.snapshot_key(original)
+                if key not in snapshots or snapshots[key] < snapshot_dt:
+                    snapshots[key] = snapshot_dt
+            if not resume_key:
+                with self._lock:
+                    for key, snapshot_dt in snapshots.items():
+                        if key not in self._latest_snapshots or self._latest_snapshots[key] < snapshot_dt:
+                            self._latest_snapshots[key] = snapshot_dt
+                log_message(
+                    "INFO",
+                    f"Prefetched {len(snapshots)} recent captures for {host} in {page_number} CDX requests.",
+                    debug_only=True,
+                )
+                return True
+            params["resumeKey"] = resume_key
+        log_message(
+            "WARNING",
+            f"CDX prefetch for {host} stopped after {max_pages} pages. Falling back to per-URL lookups.",
+            debug_only=True,
+        )
+        return False
+    def ensure_prefetched(self, url: str) -> bool:
+        host = self.prefetch_host(url)
+        with self._lock:
+            if host in self._attempted_domains:
+                return host in self._covered_domains
+            domain_lock = self._domain_locks.setdefault(host, threading.Lock())
+        with domain_lock:
+            with self._lock:
+                if host in self._attempted_domains:
+                    return host in self._covered_domains
+            is_covered = self._fetch_domain(host)
+            with self._lock:
+                self._attempted_domains.add(host)
+                if is_covered:
+                    self._covered_domains.add(host)
+            return is_covered
+    def lookup(self, url: str):
+        # Returns (covered, last_archived_dt); a covered URL with no capture has not
+        # been archived within the cooldown. Hosts whose prefetch failed or hit
+        # cdx_prefetch_max_pages are not covered, so the caller looks the URL up itself.
+        if not self.ensure_prefetched(url):
+            return False, None
+        with self._lock:
+            return True, self._latest_snapshots.get(self.snapshot_key(url))
+    def reset(self) -> None:
+        with self._lock:
+            self._latest_snapshots.clear()
+            self._covered_domains.clear()
+            self._attempted_domains.clear()
+            self._domain_locks.clear()
+class Archiver:
+    def __init__(self, dead_urls: DeadUrlCache = None) -> None:
+        self.dead_urls = dead_urls
         self.global_archive_action = SETTINGS.get(
             "default_archiving_action", "n"
         ).lower()
@@ -602,156 +2223,664 @@ class Archiver:
                 debug_only=False
             )
             self.global_archive_action = "n"
+        self.snapshot_index = WaybackSnapshotIndex()
+        self.rate_limiter = SavePageNowRateLimiter(
+            float(SETTINGS["urls_per_minute_limit"]),
+            int(SETTINGS.get("archive_burst", 1)),
+        )
+        self.capture_poller = None
+        self._capture_futures = {}
+        self._lock = threading.Lock()
+        if SETTINGS.get("archive_engine", "waybackpy") == "spn2":
+            if SETTINGS.get("spn2_access_key") and SETTINGS.get("spn2_secret_key"):
+                self.capture_poller = SavePageNowJobPoller(
+                    f"LOW {SETTINGS['spn2_access_key']}:{SETTINGS['spn2_secret_key']}"
+                )
+            else:
+                log_message(
+                    "WARNING",
+                    "The 'spn2' archive engine needs spn2_access_key and spn2_secret_key. Falling back to 'waybackpy'.",
+                    debug_only=False
+                )
+        self.status_cache = None
+        if SETTINGS.get("archive_cache_file"):
+            try:
+                self.status_cache = ArchiveStatusCache(SETTINGS["archive_cache_file"])
+            except sqlite3.Error as e:
+                log_message("WARNING", f"Could not open archive cache {SETTINGS['archive_cache_file']}: {e}", debug_only=False)
     def should_archive(self, url: str):
         user_agent = generate_random_user_agent()
-        _ = get_requests_session()
         wayback = waybackpy.Url(url, user_agent)
         if self.global_archive_action == "a":
             return True, wayback
         elif self.global_archive_action == "s":
             return False, wayback
+        if self.status_cache is not None and not SETTINGS.get("archive_cache_refresh", False):
+            last_archived_dt = self.status_cache.get_recent_snapshot(url)
+            if last_archived_dt is not None:
+                time_diff = datetime.now(timezone.utc) - last_archived_dt
+                log_message(
+                    "SKIPPED",
+                    "%s (Last archived %.1f hours ago, cached)",
+                    url,
+                    time_diff.total_seconds() // 3600,
+                    debug_only=True
+                )
+                return False, wayback
+        if SETTINGS.get("cdx_prefetch", True):
+            is_covered, last_archived_dt = self.snapshot_index.lookup(url)
+            if last_archived_dt is not None:
+                if self.status_cache is not None:
+                    self.status_cache.record_snapshot(url, last_archived_dt)
+                time_diff = datetime.now(timezone.utc) - last_archived_dt
+                log_message(
+                    "SKIPPED",
+                    "%s (Last archived %.1f hours ago)",
+                    url,
+                    time_diff.total_seconds() // 3600,
+                    debug_only=True
+                )
+                return False, wayback
+            elif is_covered:
+                log_message(
+                    "INFO",
+                    "Needs Archive: %s (No capture within %s days in CDX index)",
+                    url,
+                    SETTINGS["archiving_cooldown"],
+                    debug_only=True
+                )
+                return True, wayback
         retries = SETTINGS.get("retries", 3)
         attempt = 0
         while attempt < retries:
             try:
                 newest = wayback.newest()
                 last_archived_dt = newest.timestamp.replace(tzinfo=timezone.utc)
+                if self.status_cache is not None:
+                    self.status_cache.record_snapshot(url, last_archived_dt)
                 current_utc_dt = datetime.now(timezone.utc)
                 time_diff = current_utc_dt - last_archived_dt
                 if time_diff < timedelta(days=SETTINGS["archiving_cooldown"]):
                     log_message(
                         "SKIPPED",
-                        f"{url} (Last archived {time_diff.total_seconds() // 3600:.1f} hours ago)",
+                        "%s (Last archived %.1f hours ago)",
+                        url,
+                        time_diff.total_seconds() // 3600,
                         debug_only=True
                     )
                     return False, wayback
                 else:
                     log_message(
                         "INFO",
-                        f"Needs Archive: {url} "
-                        f"(Last archived {time_diff.total_seconds() // 3600:.1f} hours ago, "
-                        f"> {SETTINGS['archiving_cooldown'] * 24} hours)",
+                        "Needs Archive: %s (Last archived %.1f hours ago, > %s hours)",
+                        url,
+                        time_diff.total_seconds() // 3600,
+                        SETTINGS["archiving_cooldown"] * 24,
                         debug_only=True
                     )
                     return True, wayback
             except waybackpy.exceptions.NoCDXRecordFound:
-                log_message(
-                    "INFO",
-                    f"No existing archive found for {url}. Archiving.",
-                    debug_only=True
-                )
+                log_message("INFO", "No existing archive found for %s. Archiving.", url, debug_only=True)
                 return True, wayback
             except Exception as e:
                 attempt += 1
                 if attempt < retries:
                     log_message(
                         "WARNING",
-                        f"Error checking archive for {url}: {e}. "
-                        f"Retrying ({retries - attempt} attempts left).",
+                        "Error checking archive for %s: %s. Retrying (%s attempts left).",
+                        url,
+                        e,
+                        retries - attempt,
                         debug_only=True
                     )
                     time.sleep(5)
                 else:
                     log_message(
                         "ERROR",
-                        f"Failed to check archive for {url} after {retries} attempts: {e}. "
-                        f"Defaulting to archive.",
+                        "Failed to check archive for %s after %s attempts: %s. Defaulting to archive.",
+                        url,
+                        retries,
+                        e,
                         debug_only=True
                     )
                     return True, wayback
         return False, wayback
     def process_link_for_archiving(self, link: str) -> tuple[str, str]:
-        global last_archive_time, rate_limit_active_until_time
+        if self.dead_urls is not None and self.dead_urls.is_dead(link):
+            log_message("SKIPPED", "%s (Page not found)", link, debug_only=True)
+            return "SKIPPED", link
         needs_save, wb_obj = self.should_archive(link,)
         if not needs_save:
             return "SKIPPED", link
+        if self.capture_poller is not None:
+            return self._submit_capture(link)
+        status, link = self._save_with_retries(link, wb_obj)
+        if self.status_cache is not None:
+            self.status_cache.record_attempt(link, status)
+        return status, link
+    def _submit_capture(self, link: str) -> tuple[str, str]:
+        # Returns "SUBMITTED" once a capture job is queued; the final status is
+        # delivered by the future handed out by pop_capture_future().
         retries = SETTINGS["retries"]
         while retries > 0:
-            with archive_lock:
-                now = time.time()
-                if now < rate_limit_active_until_time:
-                    sleep_duration = rate_limit_active_until_time - now
-                    log_message(
-                        "RATE LIMIT",
-                        f"Global rate limit active. Sleeping for {sleep_duration:.2f} seconds before archiving {link}",
-                        debug_only=True,
-                    )
-                    time.sleep(sleep_duration)
-                now = time.time()
-                elapsed = now - last_archive_time
-                if elapsed < MIN_ARCHIVE_DELAY_SECONDS:
-                    sleep_duration = MIN_ARCHIVE_DELAY_SECONDS - elapsed
+            wait_time = self.rate_limiter.reserve()
+            while wait_time > 0:
+                log_message("RATE LIMIT", "Sleeping for %.2f seconds before submitting %s", wait_time, link, debug_only=True)
+                time.sleep(wait_time)
+                wait_time = self.rate_limiter.cooldown_remaining()
+            retries -= 1
+            try:
+                session = get_requests_session()
+                resp = session.post(
+                    SPN2_SAVE_ENDPOINT,
+                    data={"url": link},
+                    headers={"Accept": "application/json", "Authorization": self.capture_poller.auth_header},
+                    timeout=60,
+                )
+                if resp.status_code == 429:
+                    raise Exception(f"status code 429 while submitting {link}")
+                resp.raise_for_status()
+                submission = resp.json()
+                if not submission.get("job_id"):
+                    raise Exception(submission.get("status_ext") or submission.get("message") or "No job_id returned")
+            except Exception as e:
+                if is_save_rate_limit_error(e) and retries > 0:
                     log_message(
-                        "RATE LIMIT",
-                        f"Sleeping for {sleep_duration:.2f} seconds before archiving {link}",
+                        "WARNING",
+                        "Wayback Machine rate limit hit for %s. Activating %s second global cooldown (%s attempts left).",
+                        link,
+                        SPN_COOLDOWN_SECONDS,
+                        retries,
                         debug_only=True,
                     )
-                    time.sleep(sleep_duration)
-                last_archive_time = time.time()
-                archive_result = []
-                def _save_target():
-                    try:
-                        wb_obj.save()
-                        archive_result.append(True)
-                    except Exception as e:
-                        archive_result.append(e)
-                archive_thread = threading.Thread(target=_save_target)
-                archive_thread.daemon = True
-                archive_thread.start()
-                archive_thread.join(timeout=SETTINGS['archive_timeout_seconds'])
-                if archive_thread.is_alive():
+                    self.rate_limiter.trigger_cooldown(SPN_COOLDOWN_SECONDS)
+                    continue
+                elif retries > 0:
                     log_message(
-                        "INFO",
-                        f"Archiving {link} timed out after {SETTINGS['archive_timeout_seconds']} seconds. "
-                        f"Retrying ({retries - 1} attempts left).",
+                        "WARNING",
+                        "Could not submit %s: %s. Retrying (%s attempts left)...",
+                        link,
+                        e,
+                        retries,
                         debug_only=True
                     )
-                    retries -= 1
-                    if retries == 0:
-                        return "FAILED", link
-                    else:
-                        time.sleep(random.uniform(5, 10))
-                        continue
+                    time.sleep(random.uniform(2, 5))
+                    continue
+                if self.status_cache is not None:
+                    self.status_cache.record_attempt(link, "FAILED")
+                return "FAILED", link
+            capture_future = self.capture_poller.track(submission["job_id"], link)
+            capture_future.add_done_callback(self._record_capture_outcome)
+            with self._lock:
+                self._capture_futures[link] = capture_future
+            log_message("DEBUG", "Submitted capture job %s for %s", submission["job_id"], link, debug_only=True)
+            return "SUBMITTED", link
+        return "FAILED", link
+    def _record_capture_outcome(self, capture_future: concurrent.futures.Future) -> None:
+        if self.status_cache is None or capture_future.cancelled():
+            return
+        status, link = capture_future.result()
+        self.status_cache.record_attempt(link, status)
+    def pop_capture_future(self, link: str):
+        with self._lock:
+            return self._capture_futures.pop(link, None)
+    def _save_with_retries(self, link: str, wb_obj) -> tuple[str, str]:
+        retries = SETTINGS["retries"]
+        while retries > 0:
+            wait_time = self.rate_limiter.reserve()
+            while wait_time > 0:
+                log_message("RATE LIMIT", "Sleeping for %.2f seconds before archiving %s", wait_time, link, debug_only=True)
+                time.sleep(wait_time)
+                wait_time = self.rate_limiter.cooldown_remaining()
+            archive_result = []
+            def _save_target():
+                try:
+                    wb_obj.save()
+                    archive_result.append(True)
+                except Exception as e:
+                    archive_result.append(e)
+            archive_thread = threading.Thread(target=_save_target)
+            archive_thread.daemon = True
+            archive_thread.start()
+            archive_thread.join(timeout=SETTINGS['archive_timeout_seconds'])
+            if archive_thread.is_alive():
+                log_message(
+                    "INFO",
+                    "Archiving %s timed out after %s seconds. Retrying (%s attempts left).",
+                    link,
+                    SETTINGS["archive_timeout_seconds"],
+                    retries - 1,
+                    debug_only=True
+                )
+                retries -= 1
+                if retries == 0:
+                    return "FAILED", link
                 else:
-                    if archive_result and archive_result[0] is True:
-                        return "ARCHIVED", link
-                    elif archive_result and isinstance(archive_result[0], Exception):
-                        e = archive_result[0]
-                        error_message = str(e)
-                        rate_limit_keyword = (
-                            "Save request refused by the server. Save Page Now limits saving 15 URLs per minutes."
+                    time.sleep(random.uniform(5, 10))
+                    continue
+            else:
+                if archive_result and archive_result[0] is True:
+                    return "ARCHIVED", link
+                elif archive_result and isinstance(archive_result[0], Exception):
+                    e = archive_result[0]
+                    retries -= 1
+                    if is_save_rate_limit_error(e) and retries > 0:
+                        log_message(
+                            "WARNING",
+                            "Wayback Machine rate limit hit for %s. Activating %s second global cooldown (%s attempts left).",
+                            link,
+                            SPN_COOLDOWN_SECONDS,
+                            retries,
+                            debug_only=True,
                         )
-                        retries -= 1
-                        if rate_limit_keyword in error_message and retries > 0:
-                            with archive_lock:
-                                log_message(
-                                    "WARNING",
-                                    f"Wayback Machine rate limit hit for {link}. "
-                                    f"Pausing for 1 minute and activating global cooldown ({retries} attempts left).",
-                                    debug_only=True,
-                                )
-                                rate_limit_active_until_time = time.time() + 60
-                                time.sleep(60)
-                        elif retries > 0:
-                            log_message(
-                                "WARNING",
-                                f"Could not save {link}: {e}. Retrying ({retries} attempts left)...",
-                                debug_only=True
-                            )
-                            time.sleep(random.uniform(2, 5))
-                        else:
-                            return "FAILED", link
-                    else:
-                        retries -= 1
+                        self.rate_limiter.trigger_cooldown(SPN_COOLDOWN_SECONDS)
+                    elif retries > 0:
                         log_message(
-                            "ERROR",
-                            f"Archiving thread for {link} finished unexpectedly without result. Retrying ({retries} attempts left)...",
+                            "WARNING",
+                            "Could not save %s: %s. Retrying (%s attempts left)...",
+                            link,
+                            e,
+                            retries,
                             debug_only=True
                         )
                         time.sleep(random.uniform(2, 5))
+                    else:
+                        return "FAILED", link
+                else:
+                    retries -= 1
+                    log_message(
+                        "ERROR",
+                        "Archiving thread for %s finished unexpectedly without result. Retrying (%s attempts left)...",
+                        link,
+                        retries,
+                        debug_only=True
+                    )
+                    time.sleep(random.uniform(2, 5))
         return "FAILED", link
 '''
 =========================
+Crawl Storage
+=========================
+'''
+def url_hash64(url: str) -> int:
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+class CrawlStorage:
+    # SQLite file behind the 'disk' crawl_storage mode. Writes are committed only
+    # by commit(), which the coordinator calls together with each checkpoint, so
+    # the file always matches the last checkpoint after a crash.
+    def __init__(self, path: str, reset: bool = True) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS visited (url_hash INTEGER PRIMARY KEY)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS frontier ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, host TEXT, url TEXT, root_domain TEXT, initial_url_path TEXT)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS frontier_host ON frontier (host, id)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS archive_queue (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT)")
+        if reset:
+            for table in ("visited", "frontier", "archive_queue"):
+                self._connection.execute(f"DELETE FROM {table}")
+        self._connection.commit()
+    @staticmethod
+    def new_path() -> str:
+        storage_dir = Path(SETTINGS.get("crawl_storage_dir") or "crawl_storage")
+        storage_dir.mkdir(parents=True, exist_ok=True)
+        file_descriptor, path = tempfile.mkstemp(
+            prefix=f"crawl-{datetime.now().strftime('%Y%m%d-%H%M%S')}-", suffix=".sqlite3", dir=storage_dir
+        )
+        os.close(file_descriptor)
+        return path
+    def execute(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self._connection.execute(sql, params).rowcount
+    def fetchone(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchone()
+    def fetchall(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+    def iterate(self, sql: str, params: tuple = (), batch_size: int = 10000):
+        # Rows are fetched in batches so large tables never sit in memory at once.
+        with self._lock:
+            cursor = self._connection.execute(sql, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+    def commit(self) -> None:
+        with self._lock:
+            self._connection.commit()
+    def close(self) -> None:
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+    def remove(self) -> None:
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self.path + suffix)
+            except OSError:
+                pass
+class DiskVisitedIndex:
+    # Visited set holding 64-bit URL hashes on disk instead of URL strings.
+    def __init__(self, storage: CrawlStorage) -> None:
+        self.storage = storage
+        self._length = storage.fetchone("SELECT COUNT(*) FROM visited")[0]
+    def __len__(self) -> int:
+        return self._length
+    def __iter__(self):
+        return iter(())
+    def __contains__(self, url: str) -> bool:
+        return self.storage.fetchone("SELECT 1 FROM visited WHERE url_hash = ?", (url_hash64(url),)) is not None
+    def add(self, url: str) -> None:
+        self._length += self.storage.execute("INSERT OR IGNORE INTO visited (url_hash) VALUES (?)", (url_hash64(url),))
+    def update(self, urls) -> None:
+        for url in urls:
+            self.add(url)
+    def discard(self, url: str) -> None:
+        self._length -= self.storage.execute("DELETE FROM visited WHERE url_hash = ?", (url_hash64(url),))
+class ScalableBloomFilter:
+    # Series of Bloom filters over 64-bit integer hashes. A new, larger filter
+    # with a tighter error rate is added whenever the last one is full, so the
+    # overall false-positive rate stays below error_rate however many items arrive.
+    def __init__(self, error_rate: float = 0.001, initial_capacity: int = 100000) -> None:
+        self.error_rate = min(max(error_rate, 1e-9), 0.5)
+        self.initial_capacity = max(1, initial_capacity)
+        self._filters = []
+        self._add_filter()
+    def _add_filter(self) -> None:
+        index = len(self._filters)
+        capacity = self.initial_capacity * 2 ** index
+        # Halving the error rate of each new filter keeps the sum of all of them below error_rate.
+        filter_error_rate = self.error_rate * 0.5 ** (index + 1)
+        num_bits = max(64, math.ceil(-capacity * math.log(filter_error_rate) / math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        self._filters.append({
+            "bits": bytearray((num_bits + 7) // 8),
+            "num_bits": num_bits,
+            "num_hashes": num_hashes,
+            "capacity": capacity,
+            "count": 0,
+        })
+    @staticmethod
+    def _positions(value: int, num_bits: int, num_hashes: int):
+        # Double hashing on the two 32-bit halves of the hash.
+        value &= 0xFFFFFFFFFFFFFFFF
+        first_hash = value & 0xFFFFFFFF
+        second_hash = (value >> 32) | 1
+        for i in range(num_hashes):
+            yield (first_hash + i * second_hash) % num_bits
+    def __contains__(self, value: int) -> bool:
+        for bloom in self._filters:
+            bits = bloom["bits"]
+            if all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(value, bloom["num_bits"], bloom["num_hashes"])):
+                return True
+        return False
+    def add(self, value: int) -> None:
+        if value in self:
+            return
+        bloom = self._filters[-1]
+        if bloom["count"] >= bloom["capacity"]:
+            self._add_filter()
+            bloom = self._filters[-1]
+        bits = bloom["bits"]
+        for position in self._positions(value, bloom["num_bits"], bloom["num_hashes"]):
+            bits[position >> 3] |= 1 << (position & 7)
+        bloom["count"] += 1
+    def clear(self) -> None:
+        self._filters = []
+        self._add_filter()
+class BloomVisitedIndex:
+    # Visited set for the 'bloom' visited_index mode. Misses are answered from
+    # the in-memory filter alone; hits are confirmed against the exact hash table
+    # on disk unless visited_filter_confirm is off, in which case roughly
+    # visited_filter_error_rate of new URLs are wrongly treated as already seen.
+    def __init__(self, storage: CrawlStorage) -> None:
+        self.storage = storage
+        self.confirm_positives = bool(SETTINGS.get("visited_filter_confirm", True))
+        self._filter = ScalableBloomFilter(float(SETTINGS.get("visited_filter_error_rate", 0.001)))
+        self._length = 0
+        for (url_hash,) in storage.iterate("SELECT url_hash FROM visited"):
+            self._filter.add(url_hash)
+            self._length += 1
+    def __len__(self) -> int:
+        return self._length
+    def __iter__(self):
+        return iter(())
+    def __contains__(self, url: str) -> bool:
+        url_hash = url_hash64(url)
+        if url_hash not in self._filter:
+            return False
+        if not self.confirm_positives:
+            return True
+        return self.storage.fetchone("SELECT 1 FROM visited WHERE url_hash = ?", (url_hash,)) is not None
+    def add(self, url: str) -> None:
+        url_hash = url_hash64(url)
+        self._filter.add(url_hash)
+        self._length += self.storage.execute("INSERT OR IGNORE INTO visited (url_hash) VALUES (?)", (url_hash,))
+    def update(self, urls) -> None:
+        for url in urls:
+            self.add(url)
+    def discard(self, url: str) -> None:
+        # Bits cannot be cleared, so without confirmation the URL still reads as visited.
+        self._length -= self.storage.execute("DELETE FROM visited WHERE url_hash = ?", (url_hash64(url),))
+class DiskQueue:
+    # FIFO of URLs with a hot window in memory and the overflow on disk.
+    def __init__(self, storage: CrawlStorage) -> None:
+        self.storage = storage
+        self.hot_window = max(1, int(SETTINGS.get("crawl_storage_hot_window", 1000)))
+        self._hot_items = deque()
+        self._spilled_count = storage.fetchone("SELECT COUNT(*) FROM archive_queue")[0]
+    def __len__(self) -> int:
+        return len(self._hot_items) + self._spilled_count
+    def __iter__(self):
+        # Only the in-memory part of the queue.
+        return iter(list(self._hot_items))
+    def append(self, url: str) -> None:
+        if self._spilled_count or len(self._hot_items) >= self.hot_window:
+            self.storage.execute("INSERT INTO archive_queue (url) VALUES (?)", (url,))
+            self._spilled_count += 1
+        else:
+            self._hot_items.append(url)
+    def extend(self, urls) -> None:
+        for url in urls:
+            self.append(url)
+    def popleft(self) -> str:
+        if not self._hot_items and self._spilled_count:
+            rows = self.storage.fetchall("SELECT id, url FROM archive_queue ORDER BY id LIMIT ?", (self.hot_window,))
+            if rows:
+                self.storage.execute("DELETE FROM archive_queue WHERE id <= ?", (rows[-1][0],))
+            self._hot_items.extend(row[1] for row in rows)
+            self._spilled_count = max(0, self._spilled_count - len(rows)) if rows else 0
+        return self._hot_items.popleft()
+    def discard(self, url: str) -> None:
+        try:
+            self._hot_items.remove(url)
+        except ValueError:
+            self._spilled_count -= self.storage.execute("DELETE FROM archive_queue WHERE url = ?", (url,))
+    def clear(self) -> None:
+        self.storage.execute("DELETE FROM archive_queue")
+        self._hot_items.clear()
+        self._spilled_count = 0
+'''
+=========================
+Host Politeness
+=========================
+'''
+class HostPolitenessScheduler:
+    def __init__(self, parallel_slots: int = 1) -> None:
+        # The link search delay used to be slept by every worker, so spreading it
+        # over the worker slots keeps the same per-host request rate.
+        self.parallel_slots = max(1, parallel_slots)
+        max_in_flight_setting = int(SETTINGS.get("host_max_in_flight", 0))
+        self.max_in_flight = max_in_flight_setting if max_in_flight_setting > 0 else None
+        requests_per_minute = float(SETTINGS.get("host_requests_per_minute", 0))
+        self.refill_rate = requests_per_minute / 60 if requests_per_minute > 0 else None
+        self.burst = max(1, int(SETTINGS.get("host_burst", 5)))
+        self._next_allowed_time = {}
+        self._tokens = {}
+        self._last_refill_time = {}
+        self._in_flight_counts = {}
+        self._lock = threading.Lock()
+    def _refill(self, host: str, now: float) -> float:
+        if self.refill_rate is None:
+            return float(self.burst)
+        tokens = self._tokens.get(host, float(self.burst))
+        last_refill = self._last_refill_time.get(host, now)
+        tokens = min(float(self.burst), tokens + (now - last_refill) * self.refill_rate)
+        self._tokens[host] = tokens
+        self._last_refill_time[host] = now
+        return tokens
+    def seconds_until_ready(self, host: str) -> float:
+        with self._lock:
+            if self.max_in_flight is not None and self._in_flight_counts.get(host, 0) >= self.max_in_flight:
+                return float("inf")
+            now = time.time()
+            wait_time = max(0.0, self._next_allowed_time.get(host, 0.0) - now)
+            tokens = self._refill(host, now)
+            if tokens < 1:
+                wait_time = max(wait_time, (1 - tokens) / self.refill_rate)
+            return wait_time
+    def acquire(self, host: str) -> None:
+        with self._lock:
+            now = time.time()
+            if self.refill_rate is not None:
+                self._tokens[host] = self._refill(host, now) - 1
+            self._in_flight_counts[host] = self._in_flight_counts.get(host, 0) + 1
+    def space_render(self, host: str) -> None:
+        # The link search delay only ever applied to browser renders. In 'fixed'
+        # mode the worker still sleeps it, so the scheduler adds nothing on top.
+        if SETTINGS.get("page_wait_strategy", "anchor_stable") == "fixed":
+            return
+        gap = random.uniform(
+            float(SETTINGS["min_link_search_delay"]),
+            float(SETTINGS["max_link_search_delay"]),
+        ) / self.parallel_slots
+        self.defer(host, gap)
+    def defer(self, host: str, seconds: float) -> None:
+        with self._lock:
+            self._next_allowed_time[host] = max(self._next_allowed_time.get(host, 0.0), time.time() + seconds)
+    def release(self, host: str) -> None:
+        with self._lock:
+            in_flight = self._in_flight_counts.get(host, 0) - 1
+            if in_flight > 0:
+                self._in_flight_counts[host] = in_flight
+            else:
+                self._in_flight_counts.pop(host, None)
+    def reset(self) -> None:
+        with self._lock:
+            self._next_allowed_time.clear()
+            self._tokens.clear()
+            self._last_refill_time.clear()
+            self._in_flight_counts.clear()
+class HostFrontier:
+    # Crawl queue split per netloc and served round-robin across hosts whose
+    # politeness budget allows another request. With a CrawlStorage, each host
+    # keeps a hot window in memory and the rest of its queue on disk.
+    def __init__(self, politeness_scheduler: HostPolitenessScheduler, storage=None) -> None:
+        self.politeness_scheduler = politeness_scheduler
+        self.storage = storage
+        self.hot_window = max(1, int(SETTINGS.get("crawl_storage_hot_window", 1000)))
+        self._host_queues = {}
+        self._spilled_counts = {}
+        self._host_rotation = deque()
+        self._length = 0
+        if storage is not None:
+            for host, spilled_count in storage.fetchall("SELECT host, COUNT(*) FROM frontier GROUP BY host"):
+                self._host_queues[host] = deque()
+                self._spilled_counts[host] = spilled_count
+                self._host_rotation.append(host)
+                self._length += spilled_count
+    def __len__(self) -> int:
+        return self._length
+    def __iter__(self):
+        # Only the in-memory part of each host queue.
+        for host in list(self._host_rotation):
+            host_queue = self._host_queues.get(host)
+            if host_queue:
+                yield from list(host_queue)
+    def append(self, entry: tuple) -> None:
+        host = urlparse(entry[0]).netloc
+        host_queue = self._host_queues.get(host)
+        if host_queue is None:
+            host_queue = deque()
+            self._host_queues[host] = host_queue
+            self._host_rotation.append(host)
+        if self.storage is not None and (self._spilled_counts.get(host) or len(host_queue) >= self.hot_window):
+            self.storage.execute(
+                "INSERT INTO frontier (host, url, root_domain, initial_url_path) VALUES (?, ?, ?, ?)",
+                (host, *entry),
+            )
+            self._spilled_counts[host] = self._spilled_counts.get(host, 0) + 1
+        else:
+            host_queue.append(entry)
+        self._length += 1
+    def _refill(self, host: str, host_queue: deque) -> None:
+        rows = self.storage.fetchall(
+            "SELECT id, url, root_domain, initial_url_path FROM frontier WHERE host = ? ORDER BY id LIMIT ?",
+            (host, self.hot_window),
+        )
+        if rows:
+            self.storage.execute("DELETE FROM frontier WHERE host = ? AND id <= ?", (host, rows[-1][0]))
+        host_queue.extend(tuple(row[1:]) for row in rows)
+        remaining = self._spilled_counts.get(host, 0) - len(rows)
+        if remaining > 0 and rows:
+            self._spilled_counts[host] = remaining
+        else:
+            self._spilled_counts.pop(host, None)
+    def _remove_host(self, host: str) -> None:
+        del self._host_queues[host]
+        self._spilled_counts.pop(host, None)
+        self._host_rotation.remove(host)
+    def pop_ready(self):
+        for _ in range(len(self._host_rotation)):
+            host = self._host_rotation[0]
+            self._host_rotation.rotate(-1)
+            host_queue = self._host_queues[host]
+            if self.politeness_scheduler.seconds_until_ready(host) > 0:
+                continue
+            if not host_queue and self._spilled_counts.get(host):
+                self._refill(host, host_queue)
+            if not host_queue:
+                self._remove_host(host)
+                continue
+            entry = host_queue.popleft()
+            self._length -= 1
+            if not host_queue and not self._spilled_counts.get(host):
+                self._remove_host(host)
+            return host, entry
+        return None
+    def seconds_until_next_ready(self) -> float:
+        return min(
+            (self.politeness_scheduler.seconds_until_ready(host) for host in self._host_rotation),
+            default=float("inf"),
+        )
+    def discard_root_domain(self, root_domain: str) -> int:
+        discarded = 0
+        for host in list(self._host_rotation):
+            if get_root_domain(host) == root_domain:
+                discarded += len(self._host_queues[host]) + self._spilled_counts.get(host, 0)
+                if self.storage is not None and self._spilled_counts.get(host):
+                    self.storage.execute("DELETE FROM frontier WHERE host = ?", (host,))
+                self._remove_host(host)
+        self._length -= discarded
+        return discarded
+    def clear(self) -> None:
+        if self.storage is not None:
+            self.storage.execute("DELETE FROM frontier")
+        self._host_queues.clear()
+        self._spilled_counts.clear()
+        self._host_rotation.clear()
+        self._length = 0
+'''
+=========================
 Crawl Coordinator
 =========================
 '''
@@ -759,13 +2888,29 @@ class CrawlCoordinator:
     def __init__(self) -> None:
         self.webdriver_manager = WebDriverManager()
         self.crawler = Crawler(self.webdriver_manager)
-        self.archiver = Archiver()
-        self.crawling_queue = deque()
-        self.queue_for_archiving = deque()
-        self.visited_urls = set()
-        self.crawling_futures_set = set()
-        self.archiving_futures_set = set()
+        self.archiver = Archiver(self.crawler.fetch_policy.dead_urls)
+        self.sitemap_seeder = SitemapSeeder()
+        self.fetch_engine = None
+        if SETTINGS.get("crawl_engine", "threads") == "async":
+            if httpx is not None:
+                self.fetch_engine = AsyncFetchEngine(self.crawler)
+            else:
+                log_message(
+                    "WARNING",
+                    "The 'async' crawl engine needs the httpx package. Falling back to 'threads'.",
+                    debug_only=False
+                )
+        self.storage = None
+        self._open_storage()
+        self.crawling_futures = {}
+        self.archiving_futures = {}
+        self.capture_futures = {}
+        self.seeding_futures = {}
+        self.sitemap_seeds = deque()
         self.skipped_root_domains = set()
+        self.challenge_requeue_counts = {}
+        # A resumed crawl keeps checkpointing to the file it was resumed from.
+        self.checkpoint_path = SETTINGS.get("checkpoint_file")
         self.initial_url_path = None
         self.archived_count = 0
         self.skipped_count = 0
@@ -774,18 +2919,48 @@ class CrawlCoordinator:
         self.is_paused = False
         self.should_stop = False
         self.pause_lock = threading.Lock()
+        self._events = queue.Queue()
         self._resolve_worker_counts()
+        self.politeness_scheduler = HostPolitenessScheduler(self.max_crawler_workers)
+        self.crawler.challenge_tracker.backoff_callback = self.politeness_scheduler.defer
+        self.crawler.fetch_policy.backoff_callback = self.politeness_scheduler.defer
+        self.crawler.render_callback = self.politeness_scheduler.space_render
+        self._create_url_collections()
+    def _open_storage(self) -> None:
+        # The storage file backs the 'disk' crawl_storage mode and the exact tier
+        # of the 'bloom' visited index, which can also be used with in-memory queues.
+        self.storage_mode = SETTINGS.get("crawl_storage", "memory")
+        self.visited_index_mode = SETTINGS.get("visited_index", "exact")
+        if self.storage_mode == "disk" or self.visited_index_mode == "bloom":
+            self.storage = CrawlStorage(CrawlStorage.new_path())
+    def _create_url_collections(self) -> None:
+        if self.storage is not None and self.storage_mode == "disk":
+            self.crawling_queue = HostFrontier(self.politeness_scheduler, self.storage)
+            self.queue_for_archiving = DiskQueue(self.storage)
+        else:
+            self.crawling_queue = HostFrontier(self.politeness_scheduler)
+            self.queue_for_archiving = deque()
+        if self.storage is not None and self.visited_index_mode == "bloom":
+            self.visited_urls = BloomVisitedIndex(self.storage)
+        elif self.storage is not None and self.storage_mode == "disk":
+            self.visited_urls = DiskVisitedIndex(self.storage)
+        else:
+            self.visited_urls = set()
     def _resolve_worker_counts(self) -> None:
+        # 0 means the ThreadPoolExecutor default (what the executors always used
+        # for it), resolved here so in-flight work never exceeds the threads that can run it.
         max_crawler_workers_setting = SETTINGS["max_crawler_workers"]
         if max_crawler_workers_setting == 0:
-            self.max_crawler_workers = None
+            self.max_crawler_workers = default_worker_count()
         else:
             self.max_crawler_workers = max_crawler_workers_setting
         max_archiver_workers_setting = SETTINGS["max_archiver_workers"]
         if max_archiver_workers_setting == 0:
-            self.max_archiver_workers = None
+            self.max_archiver_workers = default_worker_count()
         else:
             self.max_archiver_workers = max_archiver_workers_setting
+        max_capture_jobs_setting = SETTINGS.get("spn2_max_active_jobs", 5)
+        self.max_capture_jobs = max_capture_jobs_setting if max_capture_jobs_setting > 0 else None
         if SETTINGS.get("safety_switch", False):
             self.max_crawler_workers = 1
             SETTINGS["min_link_search_delay"] = 12.0
@@ -795,6 +2970,118 @@ class CrawlCoordinator:
                 "Safety is enabled. Crawling with 1 worker and increasing cooldown.",
                 debug_only=False,
             )
+        # The async engine keeps many fetches in flight; only browser work needs a crawler thread.
+        self.max_crawl_tasks = self.max_crawler_workers
+        if self.fetch_engine is not None and not SETTINGS.get("safety_switch", False):
+            self.max_crawl_tasks = max(self.max_crawler_workers, self.fetch_engine.max_connections)
+    def save_checkpoint(self, path: str = None) -> None:
+        path = path or self.checkpoint_path
+        if not path:
+            if self.storage is not None:
+                self.storage.commit()
+            return
+        # In-flight work is stored as queued so it is retried after a resume.
+        crawling_entries = [list(entry) for entry in self.crawling_queue]
+        crawling_entries += [list(crawl_info) for crawl_info in list(self.crawling_futures.values())]
+        sitemap_seeds = [list(seed) for seed in self.sitemap_seeds]
+        sitemap_seeds += [list(seed) for seed in list(self.seeding_futures.values())]
+        archiving_entries = list(self.queue_for_archiving)
+        archiving_entries += list(self.archiving_futures.values()) + list(self.capture_futures.values())
+        if self.storage is not None:
+            self.storage.commit()
+        state = {
+            "version": 1,
+            "saved_at": time.time(),
+            "storage_file": self.storage.path if self.storage is not None else None,
+            "crawl_storage": self.storage_mode,
+            "visited_index": self.visited_index_mode,
+            "initial_url_path": self.initial_url_path,
+            "crawling_queue": crawling_entries,
+            "sitemap_seeds": sitemap_seeds,
+            "queue_for_archiving": archiving_entries,
+            "visited_urls": list(self.visited_urls),
+            "skipped_root_domains": list(self.skipped_root_domains),
+            "archived_count": self.archived_count,
+            "skipped_count": self.skipped_count,
+            "failed_count": self.failed_count,
+            "total_links_to_archive": self.total_links_to_archive,
+        }
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            log_message(
+                "DEBUG",
+                f"Checkpoint saved to {path} ({len(crawling_entries)} to crawl, {len(archiving_entries)} to archive).",
+                debug_only=True,
+            )
+        except OSError as e:
+            log_message("WARNING", f"Failed to save checkpoint to {path}: {e}", debug_only=False)
+    def load_checkpoint(self, path: str) -> bool:
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            log_message("ERROR", f"Failed to load checkpoint {path}: {e}", debug_only=False)
+            return False
+        if state.get("storage_file"):
+            # Disk mode keeps the visited index and queue overflow in the storage file.
+            if not os.path.exists(state["storage_file"]):
+                log_message(
+                    "ERROR",
+                    f"Cannot resume from {path}: its crawl storage {state['storage_file']} no longer exists.",
+                    debug_only=False,
+                )
+                return False
+            try:
+                resumed_storage = CrawlStorage(state["storage_file"], reset=False)
+            except sqlite3.Error as e:
+                log_message("ERROR", f"Failed to open crawl storage {state['storage_file']}: {e}", debug_only=False)
+                return False
+            if self.storage is not None and os.path.abspath(self.storage.path) != os.path.abspath(resumed_storage.path):
+                self.storage.remove()
+            self.storage = resumed_storage
+            self.storage_mode = state.get("crawl_storage", "disk")
+            self.visited_index_mode = state.get("visited_index", "exact")
+            self._create_url_collections()
+        self.initial_url_path = state.get("initial_url_path")
+        self.visited_urls.update(state.get("visited_urls", []))
+        self.skipped_root_domains.update(state.get("skipped_root_domains", []))
+        for entry in state.get("crawling_queue", []):
+            if entry[1] not in self.skipped_root_domains:
+                self.crawling_queue.append(tuple(entry))
+        self.sitemap_seeds.extend(tuple(seed) for seed in state.get("sitemap_seeds", []))
+        self.queue_for_archiving.extend(OrderedDict.fromkeys(state.get("queue_for_archiving", [])))
+        self.archived_count = state.get("archived_count", 0)
+        self.skipped_count = state.get("skipped_count", 0)
+        self.failed_count = state.get("failed_count", 0)
+        self.total_links_to_archive = state.get("total_links_to_archive", len(self.queue_for_archiving))
+        if self.checkpoint_path:
+            # Unless checkpoints are disabled, progress is saved back to the resumed file.
+            self.checkpoint_path = path
+        log_message(
+            "INFO",
+            f"Resumed from {path}: {len(self.crawling_queue)} URLs to crawl, "
+            f"{len(self.queue_for_archiving)} to archive, {len(self.visited_urls)} already seen.",
+            debug_only=False,
+        )
+        return True
+    def _remove_checkpoint(self) -> None:
+        path = self.checkpoint_path
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    def remove_url_live(self, url: str) -> None:
+        self.visited_urls.discard(url)
+        if isinstance(self.queue_for_archiving, DiskQueue):
+            self.queue_for_archiving.discard(url)
+        else:
+            self.queue_for_archiving = deque(u for u in self.queue_for_archiving if u != url)
     def add_initial_urls(self, urls):
         for url in urls:
             parsed_url = urlparse(url)
@@ -817,6 +3104,15 @@ class CrawlCoordinator:
                 self.crawling_queue.append((normalized_url, root_domain, self.initial_url_path))
                 self.queue_for_archiving.append(normalized_url)
                 self.total_links_to_archive = len(self.queue_for_archiving)
+                self._add_sitemap_seed(normalized_url, root_domain)
+    def _add_sitemap_seed(self, url: str, root_domain: str) -> None:
+        # robots.txt and the sitemaps are read once per site by the crawler executor.
+        if not SETTINGS.get("sitemap_seeding", True):
+            return
+        site = urlparse(url)[:2]
+        seeded_sites = [urlparse(seed[0])[:2] for seed in list(self.sitemap_seeds) + list(self.seeding_futures.values())]
+        if site not in seeded_sites:
+            self.sitemap_seeds.append((url, root_domain, self.initial_url_path))
     def add_url_live(self, url: str):
         parsed_url = urlparse(url)
         if not parsed_url.scheme:
@@ -838,24 +3134,40 @@ class CrawlCoordinator:
             self.crawling_queue.append((normalized_url, root_domain, self.initial_url_path))
             self.queue_for_archiving.append(normalized_url)
             self.total_links_to_archive += 1
+            self._wake()
     def pause(self):
         with self.pause_lock:
             self.is_paused = True
             log_message("INFO", "Crawling and archiving paused", debug_only=False)
+        self._wake()
     def resume(self):
         with self.pause_lock:
             self.is_paused = False
             log_message("INFO", "Crawling and archiving resumed", debug_only=False)
+        self._wake()
     def stop(self):
         self.should_stop = True
         log_message("INFO", "Stopping crawling and archiving", debug_only=False)
+        self._wake()
+    def _wake(self) -> None:
+        self._events.put(None)
+    def _on_future_done(self, future: concurrent.futures.Future) -> None:
+        self._events.put(future)
     def reset_state(self):
-        self.crawling_queue = deque()
-        self.queue_for_archiving = deque()
-        self.visited_urls = set()
-        self.crawling_futures_set = set()
-        self.archiving_futures_set = set()
+        if self.storage is not None:
+            self.storage.remove()
+            self.storage = None
+        self._open_storage()
+        self._create_url_collections()
+        self.crawling_futures = {}
+        self.archiving_futures = {}
+        self.capture_futures = {}
+        self.seeding_futures = {}
+        self.sitemap_seeds = deque()
+        self._events = queue.Queue()
         self.skipped_root_domains = set()
+        self.politeness_scheduler.reset()
+        self.archiver.snapshot_index.reset()
         self.archived_count = 0
         self.skipped_count = 0
         self.failed_count = 0
@@ -864,19 +3176,38 @@ class CrawlCoordinator:
         self.should_stop = False
     def is_completed(self):
         return (not self.crawling_queue and
+                not self.sitemap_seeds and
+                not self.seeding_futures and
                 not self.queue_for_archiving and
-                not self.crawling_futures_set and
-                not self.archiving_futures_set and
+                not self.crawling_futures and
+                not self.archiving_futures and
+                not self.capture_futures and
                 not self.is_paused and
                 not self.should_stop)
     def _submit_crawl_tasks(self, executor):
+        while (
+            self.sitemap_seeds
+            and len(self.crawling_futures) + len(self.seeding_futures) < self.max_crawl_tasks
+            and not self.is_paused
+            and not self.should_stop
+        ):
+            url, root_domain, initial_url_path = self.sitemap_seeds.popleft()
+            if root_domain in self.skipped_root_domains:
+                continue
+            future = executor.submit(self.sitemap_seeder.collect_links, url, initial_url_path)
+            self.seeding_futures[future] = (url, root_domain, initial_url_path)
+            future.add_done_callback(self._on_future_done)
+            log_message("DEBUG", "Submitted sitemap seeding task for: %s", url, debug_only=True)
         while (
             self.crawling_queue
-            and (self.max_crawler_workers is None or len(self.crawling_futures_set) < self.max_crawler_workers)
+            and len(self.crawling_futures) + len(self.seeding_futures) < self.max_crawl_tasks
             and not self.is_paused
             and not self.should_stop
         ):
-            url, root_domain, initial_url_path = self.crawling_queue.popleft()
+            ready_entry = self.crawling_queue.pop_ready()
+            if ready_entry is None:
+                break
+            host, (url, root_domain, initial_url_path) = ready_entry
             if root_domain in self.skipped_root_domains:
                 log_message(
                     "INFO",
@@ -884,20 +3215,109 @@ class CrawlCoordinator:
                     debug_only=True,
                 )
                 continue
-            future = executor.submit(self.crawler.crawl_single_page, url, initial_url_path)
-            self.crawling_futures_set.add((future, url, root_domain, initial_url_path))
-            log_message("INFO", f"Submitted crawl task for: {url}", debug_only=True)
+            self.politeness_scheduler.acquire(host)
+            if self.fetch_engine is not None:
+                future = self.fetch_engine.submit(url, initial_url_path, executor)
+            else:
+                future = executor.submit(self.crawler.crawl_single_page, url, initial_url_path)
+            self.crawling_futures[future] = (url, root_domain, initial_url_path)
+            future.add_done_callback(self._on_future_done)
+            log_message("INFO", "Submitted crawl task for: %s", url, debug_only=True)
     def _submit_archive_tasks(self, executor):
         while (
             self.queue_for_archiving
-            and (self.max_archiver_workers is None or len(self.archiving_futures_set) < self.max_archiver_workers)
+            and len(self.archiving_futures) < self.max_archiver_workers
+            and (self.max_capture_jobs is None or len(self.capture_futures) < self.max_capture_jobs)
             and not self.is_paused
             and not self.should_stop
         ):
             url = self.queue_for_archiving.popleft()
             future = executor.submit(self.archiver.process_link_for_archiving, url)
-            self.archiving_futures_set.add((future, url))
-            log_message("DEBUG", f"Submitted archive task for: {url}", debug_only=True)
+            self.archiving_futures[future] = url
+            future.add_done_callback(self._on_future_done)
+            log_message("DEBUG", "Submitted archive task for: %s", url, debug_only=True)
+    def _handle_crawl_result(self, future, url: str, current_branch_root: str, initial_url_path: str, crawling_enabled: bool) -> None:
+        self.politeness_scheduler.release(urlparse(url).netloc)
+        if future.cancelled():
+            log_message("DEBUG", f"Skipping cancelled crawl task.", debug_only=True)
+            return
+        try:
+            links_on_page, relationships_on_page = future.result()
+            log_message("DEBUG", "Crawl task for %s completed.", url, debug_only=True)
+            self.challenge_requeue_counts.pop(url, None)
+            if crawling_enabled:
+                self._enqueue_links(links_on_page, initial_url_path)
+        except HostChallengedError:
+            self._requeue_challenged_url(url, current_branch_root, initial_url_path)
+        except ConnectionRefusedForCrawlerError:
+            log_message("INFO", f"Marking branch {current_branch_root} as skipped due to connection refused.", debug_only=False)
+            self.skipped_root_domains.add(current_branch_root)
+            self.crawling_queue.discard_root_domain(current_branch_root)
+        except concurrent.futures.CancelledError:
+            log_message("DEBUG", f"Crawl task for {url} was cancelled.", debug_only=True)
+        except Exception as e:
+            log_message("ERROR", f"Error while crawling {url}: {e}", debug_only=False)
+    def _requeue_challenged_url(self, url: str, root_domain: str, initial_url_path: str) -> None:
+        # The host is already deferred, so the frontier holds the URL back until the backoff ends.
+        requeue_count = self.challenge_requeue_counts.get(url, 0) + 1
+        if requeue_count > SETTINGS["retries"]:
+            self.challenge_requeue_counts.pop(url, None)
+            log_message("WARNING", f"Giving up on {url} after {requeue_count - 1} challenged attempts.", debug_only=True)
+            return
+        self.challenge_requeue_counts[url] = requeue_count
+        self.crawling_queue.append((url, root_domain, initial_url_path))
+        log_message("DEBUG", "Requeued challenged URL %s (attempt %s).", url, requeue_count, debug_only=True)
+    def _enqueue_links(self, links, initial_url_path: str) -> None:
+        for link in links:
+            if link not in self.visited_urls:
+                self.visited_urls.add(link)
+                link_root_domain = get_root_domain(urlparse(link).netloc)
+                self.crawling_queue.append((link, link_root_domain, initial_url_path))
+                self.queue_for_archiving.append(link)
+                self.total_links_to_archive += 1
+                log_message("DEBUG", "Branching to: %s via %s", link_root_domain, link, debug_only=True)
+    def _handle_seed_result(self, future, url: str, root_domain: str, initial_url_path: str, crawling_enabled: bool) -> None:
+        if future.cancelled():
+            return
+        try:
+            links_in_sitemaps, _ = future.result()
+            if crawling_enabled and root_domain not in self.skipped_root_domains:
+                self._enqueue_links(links_in_sitemaps, initial_url_path)
+        except concurrent.futures.CancelledError:
+            log_message("DEBUG", f"Sitemap seeding for {url} was cancelled.", debug_only=True)
+        except Exception as e:
+            log_message("WARNING", f"Error while reading sitemaps for {url}: {e}", debug_only=True)
+    def _handle_archive_result(self, future, url: str) -> None:
+        if future.cancelled():
+            log_message("DEBUG", f"Skipping cancelled archive task.", debug_only=True)
+            return
+        try:
+            status, result_url = future.result()
+            if status == "SUBMITTED":
+                capture_future = self.archiver.pop_capture_future(result_url)
+                if capture_future is not None:
+                    self.capture_futures[capture_future] = url
+                    capture_future.add_done_callback(self._on_future_done)
+                    log_message("DEBUG", "Waiting on capture job for: %s", url, debug_only=True)
+                    return
+                status = "FAILED"
+            if status == "ARCHIVED":
+                self.archived_count += 1
+            elif status == "SKIPPED":
+                self.skipped_count += 1
+            elif status == "FAILED":
+                self.failed_count += 1
+            log_message("INFO", "[%s] %s%s", status, result_url, self._progress_suffix(), debug_only=False)
+        except concurrent.futures.CancelledError:
+            log_message("DEBUG", f"Archive task for {url} was cancelled.", debug_only=True)
+        except Exception as e:
+            self.failed_count += 1
+            log_message("ERROR", f"Error while archiving {url}: {e}{self._progress_suffix()}", debug_only=True)
+    def _progress_suffix(self) -> str:
+        processed = self.archived_count + self.skipped_count + self.failed_count
+        if self.total_links_to_archive > 0:
+            return f" ({processed}/{self.total_links_to_archive} {processed/self.total_links_to_archive*100:.2f}%)"
+        return f" ({processed} links processed)"
     def run(self):
         log_message(
             "INFO",
@@ -911,120 +3331,123 @@ class CrawlCoordinator:
         archiving_enabled = True
         crawler_executor = None
         archiver_executor = None
+        run_completed = False
+        last_checkpoint_time = time.time()
+        checkpoint_interval = SETTINGS.get("checkpoint_interval", 60)
         try:
             crawler_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_crawler_workers)
             archiver_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_archiver_workers)
             while not self.should_stop:
-                while self.is_paused and not self.should_stop:
-                    time.sleep(0.5)
-                    continue
                 current_time = time.time()
+                # Once a runtime limit trims the queues, the checkpoint taken at that moment is kept.
+                if crawling_enabled and archiving_enabled and checkpoint_interval > 0 and current_time - last_checkpoint_time >= checkpoint_interval:
+                    self.save_checkpoint()
+                    last_checkpoint_time = current_time
                 if crawling_enabled and SETTINGS["max_crawl_runtime"] > 0 and (current_time - crawl_process_start_time) > SETTINGS["max_crawl_runtime"]:
                     log_message("INFO", f"Max crawling runtime of {SETTINGS['max_crawl_runtime']} seconds reached. Stopping new crawl tasks and cancelling active ones.", debug_only=False)
+                    if archiving_enabled:
+                        self.save_checkpoint()
                     crawling_enabled = False
-                    for future, url, root_domain, initial_url_path in list(self.crawling_futures_set):
+                    for future, (url, _, _) in list(self.crawling_futures.items()):
                         if not future.done():
                             future.cancel()
                             log_message("DEBUG", f"Cancelled running/pending crawl task for {url}", debug_only=True)
-                    self.crawling_futures_set.clear()
+                    for future in list(self.seeding_futures):
+                        future.cancel()
+                    self.crawling_futures.clear()
+                    self.seeding_futures.clear()
+                    self.sitemap_seeds.clear()
                     self.crawling_queue.clear()
+                    self.politeness_scheduler.reset()
                 if archiving_enabled and SETTINGS["max_archive_runtime"] > 0 and (current_time - archive_process_start_time) > SETTINGS["max_archive_runtime"]:
                     log_message("INFO", f"Max archiving runtime of {SETTINGS['max_archive_runtime']} seconds reached. Stopping new archive tasks and cancelling active ones.", debug_only=False)
+                    if crawling_enabled:
+                        self.save_checkpoint()
                     archiving_enabled = False
-                    for future, url in list(self.archiving_futures_set):
+                    for future, url in list(self.archiving_futures.items()):
                         if not future.done():
                             future.cancel()
                             log_message("DEBUG", f"Cancelled running/pending archive task for {url}", debug_only=True)
-                    self.archiving_futures_set.clear()
+                    for future, url in list(self.capture_futures.items()):
+                        if not future.done():
+                            log_message("DEBUG", f"Abandoned pending capture job for {url}", debug_only=True)
+                    if self.archiver.capture_poller is not None:
+                        self.archiver.capture_poller.cancel_all()
+                    self.archiving_futures.clear()
+                    self.capture_futures.clear()
                     self.queue_for_archiving.clear()
                 if crawling_enabled:
                     self._submit_crawl_tasks(crawler_executor)
                 if archiving_enabled:
                     self._submit_archive_tasks(archiver_executor)
-                all_crawling_done = (not crawling_enabled) or (not self.crawling_queue and not self.crawling_futures_set)
-                all_archiving_done = (not archiving_enabled) or (not self.queue_for_archiving and not self.archiving_futures_set)
+                all_crawling_done = (not crawling_enabled) or (
+                    not self.crawling_queue and not self.crawling_futures and not self.sitemap_seeds and not self.seeding_futures
+                )
+                all_archiving_done = (not archiving_enabled) or (
+                    not self.queue_for_archiving and not self.archiving_futures and not self.capture_futures
+                )
                 if all_crawling_done and all_archiving_done:
                     log_message("INFO", "All crawling and archiving tasks completed or stopped by runtime limits.", debug_only=False)
+                    if crawling_enabled and archiving_enabled:
+                        self._remove_checkpoint()
+                        if self.storage is not None:
+                            self.storage.remove()
+                            self.storage = None
+                            self._create_url_collections()
+                    run_completed = True
                     break
-                all_active_futures = {f_info[0] for f_info in self.crawling_futures_set} | \
-                                     {f_info[0] for f_info in self.archiving_futures_set}
-                if not all_active_futures:
-                    time.sleep(0.1)
+                # Sleep until a task finishes, new work arrives, or a timed event is due.
+                wake_times = []
+                if not self.is_paused:
+                    if crawling_enabled and self.crawling_queue and len(self.crawling_futures) + len(self.seeding_futures) < self.max_crawl_tasks:
+                        wake_times.append(current_time + self.crawling_queue.seconds_until_next_ready())
+                    if crawling_enabled and SETTINGS["max_crawl_runtime"] > 0:
+                        wake_times.append(crawl_process_start_time + SETTINGS["max_crawl_runtime"])
+                    if archiving_enabled and SETTINGS["max_archive_runtime"] > 0:
+                        wake_times.append(archive_process_start_time + SETTINGS["max_archive_runtime"])
+                    if crawling_enabled and archiving_enabled and checkpoint_interval > 0:
+                        wake_times.append(last_checkpoint_time + checkpoint_interval)
+                wake_time = min(wake_times, default=float("inf"))
+                timeout = None if wake_time == float("inf") else max(0.01, wake_time - time.time())
+                try:
+                    event = self._events.get(timeout=timeout)
+                except queue.Empty:
                     continue
-                done_futures, _ = concurrent.futures.wait(
-                    all_active_futures,
-                    timeout=1,
-                    return_when=concurrent.futures.FIRST_COMPLETED
-                )
-                for future in done_futures:
-                    found_and_processed = False
-                    for cf_info in list(self.crawling_futures_set):
-                        if cf_info[0] == future:
-                            self.crawling_futures_set.remove(cf_info)
-                            if future.cancelled():
-                                log_message("DEBUG", f"Skipping cancelled crawl task.", debug_only=True)
-                                found_and_processed = True
-                                break
-                            url, current_branch_root, initial_url_path = cf_info[1], cf_info[2], cf_info[3]
-                            try:
-                                links_on_page, relationships_on_page = future.result()
-                                log_message("DEBUG", f"Crawl task for {url} completed.", debug_only=True)
-                                if crawling_enabled and not self.is_paused:
-                                    for link in links_on_page:
-                                        if link not in self.visited_urls:
-                                            self.visited_urls.add(link)
-                                            link_root_domain = get_root_domain(urlparse(link).netloc)
-                                            self.crawling_queue.append((link, link_root_domain, initial_url_path))
-                                            self.queue_for_archiving.append(link)
-                                            self.total_links_to_archive += 1
-                                            log_message("DEBUG", f"Branching to: {link_root_domain} via {link}", debug_only=True)
-                            except ConnectionRefusedForCrawlerError:
-                                log_message("INFO", f"Marking branch {current_branch_root} as skipped due to connection refused.", debug_only=False)
-                                self.skipped_root_domains.add(current_branch_root)
-                            except concurrent.futures.CancelledError:
-                                log_message("DEBUG", f"Crawl task for {url} was cancelled.", debug_only=True)
-                            except Exception as e:
-                                log_message("ERROR", f"Error while crawling {url}: {e}", debug_only=False)
-                            found_and_processed = True
-                            break
-                    if found_and_processed:
-                        continue
-                    for af_info in list(self.archiving_futures_set):
-                        if af_info[0] == future:
-                            self.archiving_futures_set.remove(af_info)
-                            if future.cancelled():
-                                log_message("DEBUG", f"Skipping cancelled archive task.", debug_only=True)
-                                break
-                            url = af_info[1]
-                            status = "FAILED"
-                            result_url = url
-                            try:
-                                status, result_url = future.result()
-                                if status == "ARCHIVED":
-                                    self.archived_count += 1
-                                elif status == "SKIPPED":
-                                    self.skipped_count += 1
-                                elif status == "FAILED":
-                                    self.failed_count += 1
-                                processed = self.archived_count + self.skipped_count + self.failed_count
-                                progress_suffix = f" ({processed}/{self.total_links_to_archive} {processed/self.total_links_to_archive*100:.2f}%)" if self.total_links_to_archive > 0 else f" ({processed} links processed)"
-                                log_message("INFO", f"[{status}] {result_url}{progress_suffix}", debug_only=False)
-                            except concurrent.futures.CancelledError:
-                                log_message("DEBUG", f"Archive task for {url} was cancelled.", debug_only=True)
-                            except Exception as e:
-                                self.failed_count += 1
-                                processed = self.archived_count + self.skipped_count + self.failed_count
-                                progress_suffix = f" ({processed}/{self.total_links_to_archive} {processed/self.total_links_to_archive*100:.2f}%)" if self.total_links_to_archive > 0 else f" ({processed} links processed)"
-                                log_message("ERROR", f"Error while archiving {url}: {e}{progress_suffix}", debug_only=True)
-                            break
+                while True:
+                    if event is not None:
+                        crawl_info = self.crawling_futures.pop(event, None)
+                        if crawl_info is not None:
+                            self._handle_crawl_result(event, *crawl_info, crawling_enabled)
+                        elif event in self.seeding_futures:
+                            self._handle_seed_result(event, *self.seeding_futures.pop(event), crawling_enabled)
+                        elif event in self.archiving_futures:
+                            self._handle_archive_result(event, self.archiving_futures.pop(event))
+                        elif event in self.capture_futures:
+                            self._handle_archive_result(event, self.capture_futures.pop(event))
+                    try:
+                        event = self._events.get_nowait()
+                    except queue.Empty:
+                        break
         except KeyboardInterrupt:
             log_message("INFO", "Keyboard interrupt received. Shutting down...", debug_only=False)
             self.should_stop = True
         finally:
+            if not run_completed and crawling_enabled and archiving_enabled:
+                self.save_checkpoint()
+            elif self.storage is not None:
+                self.storage.commit()
             if crawler_executor is not None:
                 crawler_executor.shutdown(wait=False)
             if archiver_executor is not None:
                 archiver_executor.shutdown(wait=False)
+            self.webdriver_manager.close_all()
+            if self.fetch_engine is not None:
+                self.fetch_engine.close()
+            if self.archiver.status_cache is not None:
+                self.archiver.status_cache.prune()
+            if self.crawler.page_cache is not None:
+                self.crawler.page_cache.prune()
+            self.crawler.fetch_policy.dead_urls.prune()
             log_message("INFO", "Executors shut down.", debug_only=True)
             end_time = time.time()
             duration = end_time - overall_start_time
@@ -1043,6 +3466,7 @@ class CrawlCoordinator:
                 duration_str_list.append(f"{minutes}m")
             duration_str_list.append(f"{final_seconds:.2f}s")
             duration_str = ' '.join(duration_str_list)
+            flush_logs()
             print("========== Archiving Summary ==========")
             total = self.archived_count + self.skipped_count + self.failed_count
             print(f"Total URLs processed: {total}")
@@ -1057,9 +3481,19 @@ def main():
         logging.getLogger('urllib3').setLevel(logging.CRITICAL)
         logging.getLogger('urllib3.connectionpool').setLevel(logging.CRITICAL)
     if '--gui' in sys.argv:
+        # gui.py imports this file as WaybackWhen; hand it the running module instead of loading a second copy.
+        sys.modules.setdefault("WaybackWhen", sys.modules[__name__])
         from gui import main as gui_main
         gui_main()
         return
+    if '--resume' in sys.argv:
+        resume_index = sys.argv.index('--resume') + 1
+        resume_path = sys.argv[resume_index] if resume_index < len(sys.argv) else SETTINGS.get("checkpoint_file")
+        coordinator = CrawlCoordinator()
+        if coordinator.load_checkpoint(resume_path):
+            coordinator.run()
+        return
+    flush_logs()
     target_urls_input = input(
         "Enter URLs (comma separated, e.g., https://notawebsite.org/, example.com): "
     ).strip()
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# Measures what starting WaybackWhen costs in imports, using python -X importtime.
+# 'cli' is what `python WaybackWhen.py` pays before asking for URLs, 'gui' is
+# what `python WaybackWhen.py --gui` pays before the window opens.
+REPO_ROOT = Path(__file__).resolve().parent.parent
+ENTRY_POINTS = {
+    "cli": "import WaybackWhen",
+    "gui": "import WaybackWhen, gui",
+}
+# These should only be imported once a crawl, archive or browser needs them.
+HEAVY_MODULES = (
+    "requests", "bs4", "waybackpy", "urllib3", "selenium",
+    "selenium_stealth", "webdriver_manager", "httpx", "IPython",
+)
+def measure(statement: str):
+    # Returns (total import microseconds, {module: cumulative microseconds}).
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    cumulative_times = {}
+    total_time = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_time, name = line.split("|", 2)
+        cumulative_us = int(cumulative_time.strip())
+        cumulative_times[name.strip()] = cumulative_us
+        # Top-level entries start right after the separator; their sum is the total.
+        if not name.startswith("   "):
+            total_time += cumulative_us
+    return total_time, cumulative_times
+def run_benchmark(entry_point: str, runs: int, top: int) -> dict:
+    totals = []
+    cumulative_times = {}
+    for _ in range(runs):
+        total_time, cumulative_times = measure(ENTRY_POINTS[entry_point])
+        totals.append(total_time)
+    heaviest = sorted(cumulative_times.items(), key=lambda item: item[1], reverse=True)[:top]
+    heavy_loaded = sorted({name.split(".")[0] for name in cumulative_times if name.split(".")[0] in HEAVY_MODULES})
+    return {
+        "entry_point": entry_point,
+        "runs": runs,
+        "median_ms": round(statistics.median(totals) / 1000, 1),
+        "min_ms": round(min(totals) / 1000, 1),
+        "heaviest_imports_ms": [(name, round(time_us / 1000, 1)) for name, time_us in heaviest],
+        "heavy_modules_loaded": heavy_loaded,
+    }
+def main():
+    parser = argparse.ArgumentParser(description="Measure WaybackWhen startup import time.")
+    parser.add_argument("entry_points", nargs="*", help=f"Any of {', '.join(ENTRY_POINTS)} (default all)")
+    parser.add_argument("--runs", type=int, default=5, help="Cold interpreter starts per entry point (default 5)")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest imports to list (default 10)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON, for tracking over time")
+    parser.add_argument("--max-ms", type=float, default=0, help="Exit with an error if a median exceeds this")
+    args = parser.parse_args()
+    unknown_entry_points = [entry_point for entry_point in args.entry_points if entry_point not in ENTRY_POINTS]
+    if unknown_entry_points:
+        parser.error(f"unknown entry point(s): {', '.join(unknown_entry_points)}")
+    results = []
+    for entry_point in args.entry_points or ENTRY_POINTS:
+        try:
+            results.append(run_benchmark(entry_point, max(1, args.runs), args.top))
+        except RuntimeError as e:
+            print(f"{entry_point}: could not import ({e})", file=sys.stderr)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"{result['entry_point']}: median {result['median_ms']} ms, min {result['min_ms']} ms over {result['runs']} runs")
+            for name, time_ms in result["heaviest_imports_ms"]:
+                print(f"    {time_ms:8.1f} ms  {name}")
+            if result["heavy_modules_loaded"]:
+                print(f"    loaded at startup: {', '.join(result['heavy_modules_loaded'])}")
+    if args.max_ms and any(result["median_ms"] > args.max_ms for result in results):
+        sys.exit(1)
+if __name__ == "__main__":
+    main()
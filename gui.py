@@ -4,7 +4,7 @@ import json
 import importlib
 import csv
 from pathlib import Path
-from collections import deque
+from itertools import islice
 
 from PyQt6.QtCore import QTimer, Qt, pyqtSignal, QObject, QSize
 from PyQt6.QtWidgets import (
@@ -13,7 +13,7 @@ from PyQt6.QtWidgets import (
     QCheckBox, QSpinBox, QGroupBox, QScrollArea, QTextEdit, 
     QStyleFactory, QDialog, QDialogButtonBox, QMenu, QMenuBar,
     QProgressBar, QFrame, QListWidgetItem, QTableWidget, QTableWidgetItem,
-    QHeaderView, QComboBox, QStyle,QSizePolicy,QToolButton
+    QHeaderView, QComboBox, QStyle,QSizePolicy,QToolButton, QFileDialog
 )
 from PyQt6.QtGui import QPalette, QColor, QAction, QFont, QIcon
 
@@ -90,6 +90,7 @@ class TextManager:
             "archiving_queue_title": "Archiving Queue",
             "file_menu": "&File",
             "settings_action": "&Settings",
+            "resume_crawl_action": "&Resume Saved Crawl...",
             "themes_menu": "&Themes",
             "texts_menu": "&Languages",
             "proxy_label": "Proxies (one per line):",
@@ -107,9 +108,9 @@ class TextManager:
                 writer.writerow(["Key", "Value"])
                 for key, value in english_labels.items():
                     writer.writerow([key, value])
-            log_message("INFO", "Created english text configuration", True)
+            log_message("INFO", "Created english text configuration", debug_only=True)
         except Exception as e:
-            log_message("ERROR", f"Failed to create english text: {e}", False)
+            log_message("ERROR", f"Failed to create english text: {e}", debug_only=False)
 
     def load_current_text(self):
         text_file = self.texts_dir / f"{self.current_text}.csv"
@@ -123,7 +124,7 @@ class TextManager:
                 next(reader)  # Skip header
                 self.labels = {row[0]: row[1] for row in reader if len(row) >= 2}
         except Exception as e:
-            log_message("ERROR", f"Failed to load text config: {e}", False)
+            log_message("ERROR", f"Failed to load text config: {e}", debug_only=False)
             self.labels = {}
 
     def get_text(self, key, **kwargs):
@@ -229,7 +230,7 @@ class ThemeManager:
             importlib.reload(module)
             module.apply(app, widget)
         except Exception as e:
-            log_message("ERROR", f"Theme load failed: {e}", False)
+            log_message("ERROR", f"Theme load failed: {e}", debug_only=False)
 
 class UrlListItemWidget(QWidget):
     deleteClicked = pyqtSignal(str)
@@ -329,6 +330,10 @@ class CrawlerGUI(QWidget):
         self.settings_action.triggered.connect(self.show_settings)
         self.file_menu.addAction(self.settings_action)
 
+        self.resume_crawl_action = QAction(self.text_manager.get_text("resume_crawl_action"), self)
+        self.resume_crawl_action.triggered.connect(self.resume_from_checkpoint)
+        self.file_menu.addAction(self.resume_crawl_action)
+
         # Themes menu
         self.themes_menu = self.menu_bar.addMenu(self.text_manager.get_text("themes_menu"))
         for theme in self.theme_manager.available_themes:
@@ -511,6 +516,7 @@ class CrawlerGUI(QWidget):
         self.setWindowTitle(self.text_manager.get_text("window_title"))
         self.file_menu.setTitle(self.text_manager.get_text("file_menu"))
         self.settings_action.setText(self.text_manager.get_text("settings_action"))
+        self.resume_crawl_action.setText(self.text_manager.get_text("resume_crawl_action"))
         self.themes_menu.setTitle(self.text_manager.get_text("themes_menu"))
         self.languages_menu.setTitle(self.text_manager.get_text("texts_menu"))
         
@@ -603,13 +609,8 @@ class CrawlerGUI(QWidget):
             del self.url_list_items[normalized_url]
             
         # Remove from coordinator if running
-        if self.coordinator and hasattr(self.coordinator, 'visited_urls'):
-            self.coordinator.visited_urls.discard(normalized_url)
-            if hasattr(self.coordinator, 'queue_for_archiving'):
-                # Filter out the URL from the queue
-                self.coordinator.queue_for_archiving = deque([
-                    u for u in self.coordinator.queue_for_archiving if u != normalized_url
-                ])
+        if self.coordinator:
+            self.coordinator.remove_url_live(normalized_url)
 
     def save_proxies(self):
         proxy_text = self.proxy_text.toPlainText().strip()
@@ -663,7 +664,29 @@ class CrawlerGUI(QWidget):
         
         self.coordinator = CrawlCoordinator()
         self.coordinator.add_initial_urls(urls)
+        self.start_worker()
+
+    def resume_from_checkpoint(self):
+        if self.worker_thread and self.worker_thread.is_alive():
+            log_message("INFO", self.text_manager.get_text("crawler_running_warning"), debug_only=False)
+            return
+
+        path, _ = QFileDialog.getOpenFileName(
+            self,
+            self.text_manager.get_text("resume_crawl_action").replace("&", ""),
+            SETTINGS.get("checkpoint_file", ""),
+            "JSON (*.json);;All Files (*)"
+        )
+        if not path:
+            return
+
+        self.coordinator = CrawlCoordinator()
+        if not self.coordinator.load_checkpoint(path):
+            self.coordinator = None
+            return
+        self.start_worker()
 
+    def start_worker(self):
         self.worker_thread = threading.Thread(
             target=self.coordinator.run, daemon=True
         )
@@ -704,12 +727,12 @@ class CrawlerGUI(QWidget):
 
         crawling_items = []
         if hasattr(self.coordinator, 'crawling_queue'):
-            crawling_items = [u[0] for u in list(self.coordinator.crawling_queue)[:20]]
+            crawling_items = [u[0] for u in islice(self.coordinator.crawling_queue, 20)]
         self.status_updater.update_crawling.emit(crawling_items)
 
         archiving_items = []
         if hasattr(self.coordinator, 'queue_for_archiving'):
-            archiving_items = list(self.coordinator.queue_for_archiving)[:20]
+            archiving_items = list(islice(self.coordinator.queue_for_archiving, 20))
         self.status_updater.update_archiving.emit(archiving_items)
         
         archived_count = getattr(self.coordinator, 'archived_count', 0)
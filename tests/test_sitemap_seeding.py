@@ -0,0 +1,60 @@
+import functools
+import gzip
+import http.server
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import WaybackWhen
+
+# Serves a robots.txt, a sitemap index and its sitemaps (one gzipped) from a
+# local HTTP server and checks SitemapSeeder reads every page URL from them.
+SITEMAP_NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+def urlset(urls) -> bytes:
+    entries = "".join(f"<url><loc>{url}</loc></url>" for url in urls)
+    return f'<?xml version="1.0"?><urlset xmlns="{SITEMAP_NAMESPACE}">{entries}</urlset>'.encode()
+class SitemapSeederTest(unittest.TestCase):
+    def setUp(self):
+        self.site_dir = tempfile.TemporaryDirectory()
+        handler = functools.partial(QuietHandler, directory=self.site_dir.name)
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.site_root = f"http://127.0.0.1:{self.server.server_port}"
+        self.saved_settings = dict(WaybackWhen.SETTINGS)
+        WaybackWhen.SETTINGS.update({"sitemap_max_files": 50, "sitemap_max_urls": 0})
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.site_dir.cleanup()
+        WaybackWhen.SETTINGS.clear()
+        WaybackWhen.SETTINGS.update(self.saved_settings)
+    def write(self, name: str, content: bytes):
+        Path(self.site_dir.name, name).write_bytes(content)
+    def test_reads_plain_and_gzipped_sitemaps(self):
+        plain_urls = [f"{self.site_root}/docs/plain-{i}" for i in range(10)]
+        # Large enough to span many response chunks once compressed.
+        gzipped_urls = [f"{self.site_root}/docs/gzipped-{i}" for i in range(5000)]
+        self.write("robots.txt", f"User-agent: *\nSitemap: {self.site_root}/sitemap_index.xml\n".encode())
+        self.write("sitemap_index.xml", (
+            f'<?xml version="1.0"?><sitemapindex xmlns="{SITEMAP_NAMESPACE}">'
+            f"<sitemap><loc>{self.site_root}/plain.xml</loc></sitemap>"
+            f"<sitemap><loc>{self.site_root}/pages.xml.gz</loc></sitemap>"
+            "</sitemapindex>"
+        ).encode())
+        self.write("plain.xml", urlset(plain_urls))
+        self.write("pages.xml.gz", gzip.compress(urlset(gzipped_urls)))
+        links, _ = WaybackWhen.SitemapSeeder().collect_links(f"{self.site_root}/docs", "/docs")
+        self.assertEqual(links, {WaybackWhen.normalize_url(url) for url in plain_urls + gzipped_urls})
+    def test_falls_back_to_sitemap_xml_without_robots(self):
+        page_urls = [f"{self.site_root}/docs/page-{i}" for i in range(3)]
+        self.write("sitemap.xml", gzip.compress(urlset(page_urls)))
+        links, _ = WaybackWhen.SitemapSeeder().collect_links(f"{self.site_root}/docs", "/docs")
+        self.assertEqual(links, {WaybackWhen.normalize_url(url) for url in page_urls})
+if __name__ == "__main__":
+    unittest.main()